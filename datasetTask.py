@@ -0,0 +1,111 @@
+import os
+import logging
+
+from qgis.core import QgsTask
+
+from .pygml import pygml
+
+
+class DatasetTask(QgsTask):
+    """Loads a pygml.Dataset in a background thread.
+
+    Progress is reported by the bytes parsed so far and loading stops as soon
+    as the task is cancelled. callback(task) is called in the main thread
+    when the task is finished, task.dataset is None if it failed or was
+    cancelled and task.error holds the message of a failure.
+    """
+
+    def __init__(self, filename, callback, **options):
+        QgsTask.__init__(self, 'Loading ' + os.path.basename(filename), QgsTask.CanCancel)
+        self.filename = filename
+        self.callback = callback
+        self.options = options
+        self.dataset = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.dataset = pygml.Dataset(self.filename, progress=self.reportProgress, **self.options)
+        except pygml.LoadCancelled:
+            logging.info('Loading %s cancelled' % self.filename)
+            return False
+        except pygml.GmlException as e:
+            self.error = e.message
+            return False
+        except (pygml.xmltodict.expat.ExpatError, OSError, ValueError) as e:
+            self.error = str(e)
+            return False
+        return True
+
+    def reportProgress(self, done, total):
+        if total:
+            self.setProgress(100.0 * done / total)
+        return not self.isCanceled()
+
+    def finished(self, result):
+        self.callback(self)
+
+
+class SearchIndexTask(QgsTask):
+    """Builds the word index of a loaded pygml.Dataset in a background thread,
+    see pygml.Dataset.getSearchIndex().
+
+    The dataset can be used meanwhile, the index is only set when it is
+    complete. callback(task) is called in the main thread when the task is
+    finished, task.done is False if it failed or was cancelled.
+    """
+
+    def __init__(self, dataset, callback):
+        QgsTask.__init__(self, 'Indexing ' + os.path.basename(dataset.filename), QgsTask.CanCancel)
+        self.dataset = dataset
+        self.callback = callback
+        self.done = False
+
+    def run(self):
+        try:
+            self.dataset.getSearchIndex(progress=self.reportProgress)
+        except pygml.LoadCancelled:
+            logging.info('Indexing %s cancelled' % self.dataset.filename)
+            return False
+        except (pygml.GmlException, pygml.xmltodict.expat.ExpatError, OSError) as e:
+            logging.warning('Unable to index %s: %s' % (self.dataset.filename, e))
+            return False
+        self.done = True
+        return True
+
+    def reportProgress(self, done, total):
+        if total:
+            self.setProgress(100.0 * done / total)
+        return not self.isCanceled()
+
+    def finished(self, result):
+        self.callback(self)
+
+
+class ResolverIndexTask(QgsTask):
+    """Indexes the ids of the files registered to a pygml.Resolver in a
+    background thread, see pygml.Resolver.indexIds().
+
+    callback(task) is called in the main thread when the task is finished.
+    """
+
+    def __init__(self, resolver, callback):
+        QgsTask.__init__(self, 'Indexing referenced files', QgsTask.CanCancel)
+        self.resolver = resolver
+        self.callback = callback
+
+    def run(self):
+        try:
+            self.resolver.indexIds(progress=self.reportProgress)
+        except pygml.LoadCancelled:
+            logging.info('Indexing referenced files cancelled')
+            return False
+        return True
+
+    def reportProgress(self, done, total):
+        if total:
+            self.setProgress(100.0 * done / total)
+        return not self.isCanceled()
+
+    def finished(self, result):
+        self.callback(self)
@@ -0,0 +1,55 @@
+from qgis.core import QgsFeatureRequest
+
+
+def createRequest(layer):
+    """Return a request for the gml_ids of layer, without geometries and other attributes."""
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes(['gml_id'], layer.fields())
+    return request
+
+
+def getSelectedGmlIds(layer, id_map=None):
+    """Return the gml_ids of the selected features of layer, ordered by feature id.
+
+    They are looked up in id_map if given, otherwise only the selected
+    features are requested, without geometries.
+    """
+    fids = sorted(layer.selectedFeatureIds())
+    if id_map is not None:
+        return id_map.getGmlIds(fids)
+    request = createRequest(layer)
+    request.setFilterFids(set(fids))
+    gml_ids = {feature.id(): feature.attribute('gml_id') for feature in layer.getFeatures(request)}
+    return [gml_ids[fid] for fid in fids if gml_ids.get(fid)]
+
+
+class FeatureIdMap():
+    """Maps the gml_ids of the features of a GML layer to their feature ids and back.
+
+    Built by a single request without geometries, reading only gml_id.
+    feature_count is the number of features of the layer at that time.
+    """
+
+    def __init__(self, layer):
+        self.fids = {}
+        self.gml_ids = {}
+        for feature in layer.getFeatures(createRequest(layer)):
+            gml_id = feature.attribute('gml_id')
+            if gml_id:
+                self.fids.setdefault(gml_id, feature.id())
+                self.gml_ids[feature.id()] = gml_id
+        self.feature_count = layer.featureCount()
+
+    def __len__(self):
+        return len(self.gml_ids)
+
+    def getFeatureIds(self, gml_ids):
+        """Return the feature ids of gml_ids, skipping unknown ones."""
+        fids = self.fids
+        return [fids[gml_id] for gml_id in gml_ids if gml_id in fids]
+
+    def getGmlIds(self, fids):
+        """Return the gml_ids of fids, skipping features without one."""
+        gml_ids = self.gml_ids
+        return [gml_ids[fid] for fid in fids if fid in gml_ids]
@@ -0,0 +1,121 @@
+from qgis.PyQt.QtCore import QAbstractItemModel, QModelIndex, QSortFilterProxyModel, Qt
+from qgis.PyQt.QtGui import QColor
+
+from .pygml import tree
+
+
+# colorize attributes
+def getQColor(text):
+    for indicator in ['nil']:
+        if indicator in text.lower():
+            return QColor('lightgrey')
+    for indicator in ['gml:id', 'localid', 'identifier', 'xlink:href', 'xlink:type', 'namespace', 'codespace']:
+        if indicator in text.lower():
+            return QColor(244,134,66)
+    return QColor('green')
+
+
+class FeatureModel(QAbstractItemModel):
+    """Item model over a pygml.tree.FeatureTree.
+
+    Rows are created when a view asks for them, batch_size at a time, so the
+    time to show features doesn't depend on how many or how large they are.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, feature_tree, parent=None):
+        QAbstractItemModel.__init__(self, parent)
+        self.tree = feature_tree
+
+    def getNode(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return self.tree.root
+
+    def getIndex(self, node):
+        if node.parent is None:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.getNode(parent)
+        if column != 0 or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.getIndex(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.getNode(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        return self.getNode(parent).hasChildren()
+
+    def canFetchMore(self, parent):
+        return self.getNode(parent).canFetchMore()
+
+    def fetchMore(self, parent):
+        node = self.getNode(parent)
+        start = len(node.children)
+        count = min(self.batch_size, len(node.getSources()) - start)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, start, start + count - 1)
+        node.fetchMore(count)
+        self.endInsertRows()
+
+    def match(self, query):
+        """Return the visibility mask of FeatureTree.match(query).
+
+        The search index is built once per tree, which creates all rows but
+        those of unexpanded references, so the model is reset then.
+        """
+        if not self.tree.isIndexed():
+            self.beginResetModel()
+            self.tree.getIndex()
+            self.endResetModel()
+        return self.tree.match(query)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return node.text
+        if role == Qt.ForegroundRole:
+            if node.kind == tree.LEAF:
+                return getQColor(node.text)
+            if node.kind == tree.BACK_REFERENCE:
+                return QColor('lightgrey')
+            if node.kind == tree.MESSAGE:
+                return QColor('grey')
+        return None
+
+
+class FeatureFilterModel(QSortFilterProxyModel):
+    """Shows the rows visible in mask, see SearchIndex.match(), or all rows
+    if mask is None. Rows created after the mask are shown as well."""
+
+    def __init__(self, parent=None):
+        QSortFilterProxyModel.__init__(self, parent)
+        self.mask = None
+
+    def setMask(self, mask):
+        self.mask = mask
+        self.invalidateFilter()
+
+    def isVisible(self, node):
+        position = node.position
+        return self.mask is None or position is None or position >= len(self.mask) or self.mask[position]
+
+    def filterAcceptsRow(self, row, parent):
+        return self.isVisible(self.sourceModel().index(row, 0, parent).internalPointer())
@@ -25,14 +25,18 @@ import logging
 from collections import OrderedDict
 
 from qgis.PyQt.QtCore import (
-    QSettings, QTranslator, qVersion, QCoreApplication, QTimer
+    QSettings, QTranslator, qVersion, QCoreApplication, QTimer, Qt
 )
-from qgis.PyQt.QtWidgets import QAction, QMessageBox, QTreeWidgetItem
-from qgis.PyQt.QtGui import QIcon, QColor
+from qgis.PyQt.QtWidgets import QAction, QApplication, QMessageBox
+from qgis.PyQt.QtGui import QIcon
+from qgis.core import Qgis, QgsApplication, QgsMessageLog, QgsProject
 
 # Import the code for the dialog
 from .gmlinfo_dialog import ComplexGmlInfoDialog
-from .pygml import pygml, util
+from .datasetTask import DatasetTask, ResolverIndexTask, SearchIndexTask
+from .featureIdMap import FeatureIdMap, getSelectedGmlIds
+from .featureModel import FeatureFilterModel, FeatureModel
+from .pygml import cache, pygml, query, resolver, tree, util
 from .selectTool import SelectTool
 
 
@@ -70,6 +74,16 @@ class ComplexGmlInfo:
 
         # Create the dialog (after translation) and keep reference
         self.dlg = ComplexGmlInfoDialog()
+        # rows are created on demand by the model, filtering hides rows in the proxy
+        self.model = None
+        self.filter_model = FeatureFilterModel(self.dlg)
+        self.dlg.treeView.setModel(self.filter_model)
+        self.dlg.treeView.setHeaderHidden(True)
+        # query the tree is filtered by, the dataset and tree of the selection
+        self.query = None
+        self.gml = None
+        self.selection_tree = None
+        self.dlg.finished.connect(self.cancelLoading)
 
         # Declare instance attributes
         self.actions = []
@@ -81,7 +95,42 @@ class ComplexGmlInfo:
         logfile = util.getTempfile('gmlinfo.log')
         logging.basicConfig(filename=logfile, level=logging.ERROR, format=logformat)
 
-        self.cache = {}
+        settings = QSettings()
+        # features shown for queries starting with /, see pygml.query
+        self.max_query_results = settings.value('ComplexGmlInfo/maxQueryResults', 1000, type=int)
+        # build the word index for "Select in layer" in the background once a
+        # dataset is loaded, otherwise on the first use
+        self.search_index = settings.value('ComplexGmlInfo/searchIndex', True, type=bool)
+        # processes building the search index, off by default
+        self.workers = settings.value('ComplexGmlInfo/workers', 0, type=int)
+        # property names dropped while parsing, besides the geometries
+        drop = settings.value('ComplexGmlInfo/dropProperties', [], type=list)
+        self.postprocessor = pygml.PostprocessorRules(drop=drop) if drop else None
+        # keep the parsed features as compact read-only nodes
+        self.compact = settings.value('ComplexGmlInfo/compact', False, type=bool)
+        # references nested deeper are not expanded in the tree, 0 for no limit
+        self.reference_depth = settings.value('ComplexGmlInfo/referenceDepth', 0, type=int) or None
+        # FeatureIdMaps by layer id
+        self.id_maps = {}
+        # running DatasetTasks by filename and the file the dialog waits for
+        self.tasks = {}
+        self.loading = None
+        # running SearchIndexTasks by filename
+        self.index_tasks = {}
+        # the running ResolverIndexTask
+        self.resolver_task = None
+        # optionally index GML layers in the background as soon as they are added
+        self.prewarm = settings.value('ComplexGmlInfo/prewarm', False, type=bool)
+        self.cache = cache.DatasetCache(
+            max_entries=settings.value('ComplexGmlInfo/cacheMaxEntries', 8, type=int),
+            max_bytes=settings.value('ComplexGmlInfo/cacheMaxMegabytes', 1024, type=int) * 2 ** 20)
+        # optionally resolve references into other GML files of the same folder,
+        # the datasets of these files are shared with the layers through the cache,
+        # their ids are indexed by a ResolverIndexTask once a dataset is loaded
+        self.resolver = None
+        if settings.value('ComplexGmlInfo/resolveAcrossFiles', False, type=bool):
+            self.resolver = resolver.Resolver(self.cache, background=True, lazy=True, lazy_xlink_href=True,
+                                              postprocessor=self.postprocessor, compact=self.compact)
 
     # noinspection PyMethodMayBeStatic
     def tr(self, message):
@@ -205,6 +254,23 @@ class ComplexGmlInfo:
             add_to_toolbar=None,
             parent=None)
 
+        QgsProject.instance().layerWillBeRemoved.connect(self.layerWillBeRemoved)
+        if self.prewarm:
+            QgsProject.instance().layersAdded.connect(self.layersAdded)
+
+        # filter once typing pauses, every keystroke restarts the timer and so
+        # replaces the pending query, nothing runs while the dialog is closed
+        self.filter_timer = QTimer(self.dlg)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.updateFeatureInfo)
+        self.dlg.lineEdit.textChanged.connect(self.filter_timer.start)
+        self.dlg.finished.connect(self.filter_timer.stop)
+        # queries starting with / search the whole dataset, only on Enter
+        self.dlg.lineEdit.returnPressed.connect(self.runQuery)
+        self.dlg.selectButton.clicked.connect(self.selectMatching)
+        self.dlg.treeView.clicked.connect(self.flashFeature)
+
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
         for action in self.actions:
@@ -215,30 +281,60 @@ class ComplexGmlInfo:
         # remove the toolbar
         del self.toolbar
 
+        QgsProject.instance().layerWillBeRemoved.disconnect(self.layerWillBeRemoved)
+        if self.prewarm:
+            QgsProject.instance().layersAdded.disconnect(self.layersAdded)
+        self.filter_timer.stop()
+        self.dlg.lineEdit.textChanged.disconnect(self.filter_timer.start)
+        self.dlg.finished.disconnect(self.filter_timer.stop)
+        self.dlg.lineEdit.returnPressed.disconnect(self.runQuery)
+        self.dlg.selectButton.clicked.disconnect(self.selectMatching)
+        self.dlg.treeView.clicked.disconnect(self.flashFeature)
+        for task in list(self.tasks.values()) + list(self.index_tasks.values()):
+            task.cancel()
+        if self.resolver_task:
+            self.resolver_task.cancel()
+        self.cache.clear()
+        self.id_maps.clear()
+
+    def isGmlLayer(self, layer):
+        return hasattr(layer, 'storageType') and (layer.storageType() == 'GML' or layer.storageType() == 'NAS')
+
+    def getFilename(self, layer):
+        return layer.dataProvider().dataSourceUri().split('|')[0]
+
+    def logCacheStats(self):
+        QgsMessageLog.logMessage('Dataset cache: ' + self.cache.stats(), 'Complex GML Info', Qgis.Info)
+
+    def layersAdded(self, layers):
+        # pre-warm, so the first click is answered from the cache
+        for layer in layers:
+            if self.isGmlLayer(layer):
+                filename = self.getFilename(layer)
+                if filename not in self.cache:
+                    self.loadDataset(filename, priority=-1)
+
+    def layerWillBeRemoved(self, layer_id):
+        # evict the dataset unless another layer still uses the same file
+        self.id_maps.pop(layer_id, None)
+        layer = QgsProject.instance().mapLayer(layer_id)
+        if not (layer and self.isGmlLayer(layer)):
+            return
+        filename = self.getFilename(layer)
+        if filename not in self.cache:
+            return
+        for other in QgsProject.instance().mapLayers().values():
+            if other.id() != layer_id and self.isGmlLayer(other) and self.getFilename(other) == filename:
+                return
+        self.cache.remove(filename)
+        self.logCacheStats()
+
     def about(self):
         infoString = "<table><tr><td colspan=\"3\"><b>Complex GML Info 0.5</b></td></tr><tr><td colspan=\"3\"></td></tr><tr><td rowspan=\"3\">Authors:</td><td>J&uuml;rgen Weichand</td><td><a href=\"mailto:juergen@weichand.de\">juergen@weichand.de</a></td></tr><tr><td colspan=\"2\">Tim Vinving</td></tr><tr><td rowspan=\"3\">Authors:</td><td>Edward Nash</td><td><a href=\"mailto:e.nash@dvz-mv.de\">e.nash@dvz-mv.de</a></td></tr><tr><td>Website:</td><td><a href=\"http://github.com/qgisinspiretools/qgis-complex-gmlinfo-plugin\">http://github.com/qgisinspiretools/qgis-complex-gmlinfo-plugin</a></td></tr></table>"
         QMessageBox.information(self.iface.mainWindow(), "About Complex GML Info", infoString)
 
     def run(self):
-        self.dlg.treeWidget.setHeaderHidden(True)
         self.displayFeatureInfo()
-        self.dlg.lineEdit.textChanged.connect(self.resetTimer)
-        self.q = self.dlg.lineEdit.text()
-        self.timer = QTimer()
-        self.timer.setInterval(500)
-        self.timer.start()
-        self.timer.timeout.connect(self.checkUpdateFeatureInfo)
-
-    def resetTimer(self):
-        self.timer.stop()
-        self.timer.start()
-
-    def checkUpdateFeatureInfo(self):
-        if not self.q == self.dlg.lineEdit.text():
-            self.q = self.dlg.lineEdit.text()
-            self.updateFeatureInfo()
-            self.timer.stop()
-            self.timer.start()
 
     def displayFeatureInfo(self):
         layer = self.iface.activeLayer()
@@ -249,13 +345,13 @@ class ComplexGmlInfo:
             return
 
         # layer must be GML
-        if not (hasattr(layer, 'storageType') and (layer.storageType() == 'GML' or layer.storageType() == 'NAS')):
+        if not self.isGmlLayer(layer):
             QMessageBox.critical(self.dlg, 'Error', u'Please activate a GML layer - the active layer is not GML!')
             return
 
         self.previous_map_tool = self.iface.mapCanvas().mapTool()
 
-        if not layer.selectedFeatures():
+        if not layer.selectedFeatureCount():
             tool = SelectTool(self.iface, self.show_Info)
             self.iface.mapCanvas().setMapTool(tool)
         else:
@@ -264,120 +360,270 @@ class ComplexGmlInfo:
     def show_Info(self):
         layer = self.iface.activeLayer()
 
-        filename = layer.dataProvider().dataSourceUri().split('|')[0]
-
-        if not filename in self.cache:
-            logging.debug('%s not cached yet!' % filename)
-            try:
-                self.cache[filename] = pygml.Dataset(filename)
-            except pygml.GmlException as e:
-                QMessageBox.critical(self.dlg, 'Error', e.message)
-                return
-
-        gml = self.cache[filename]
-
         # >= 1 feature must be selected
-        if not layer.selectedFeatures():
+        if not layer.selectedFeatureCount():
             QMessageBox.critical(self.dlg, 'Error', u'Please select one or more feature(s) first!')
             return
         else:
             self.dlg.show()
 
-        features = OrderedDict()
-        i = 0
+        if self.previous_map_tool:
+            self.iface.mapCanvas().setMapTool(self.previous_map_tool)
 
-        for feature in layer.selectedFeatures():
-            if feature.attribute('gml_id'):
-                i+=1
-                gml_id = feature.attribute('gml_id')
-                features['Selected feature [' + str(i) +']'] = gml.getFeature(gml_id)
+        filename = self.getFilename(layer)
 
-        self.fill_widget(self.dlg.treeWidget, features)
+        gml = self.getDataset(filename)
+        if gml is None:
+            # filled by datasetLoaded() once the dataset is ready
+            self.showLoading(filename)
+            return
+        self.loading = None
 
-        if self.previous_map_tool:
-            self.iface.mapCanvas().setMapTool(self.previous_map_tool)
+        features = OrderedDict()
+        # no geometries are fetched, a cached map of the layer avoids the request
+        id_map = self.id_maps.get(layer.id())
+        if id_map is not None and id_map.feature_count != layer.featureCount():
+            id_map = None
+        gml_ids = getSelectedGmlIds(layer, id_map)
+
+        for i, feature in enumerate(gml.getFeatures(gml_ids), 1):
+            features['Selected feature [' + str(i) +']'] = feature
+
+        self.gml = gml
+        self.setTree(tree.FeatureTree(features, gml_ids, self.reference_depth))
+        if self.dlg.lineEdit.text():
+            self.filter_timer.start()
+
+    def getDataset(self, filename):
+        """Return the cached dataset of filename or start loading it and return None."""
+        gml = self.cache.get(filename)
+        if gml is not None and gml.isModified():
+            # the sidecar index lets the reload only scan what was appended
+            logging.debug('%s was modified!' % filename)
+            self.cache.remove(filename)
+            self.removeIdMaps(filename)
+            gml = None
+        if gml is None:
+            logging.debug('%s not cached yet!' % filename)
+            self.loadDataset(filename)
+        return gml
 
-    # based on http://stackoverflow.com/questions/21805047/qtreewidget-to-mirror-python-dictionary
-    def fill_item(self, item, value):
-        item.setExpanded(True)
-        if type(value) is OrderedDict:
-            for key, val in sorted(value.items()):
-                if type(val) is str:
-                    if '@xmlns' not in key: # hack
-                        child = QTreeWidgetItem()
-                        text = str(key + " '" + val + "'")
-                        child.setForeground(0, self.getQColor(text))
-                        child.setText(0, text)
-                        item.addChild(child)
-                else:
-                    child = QTreeWidgetItem()
-                    text = str(key)
-                    #child.setForeground(0, self.getQColor(text))
-                    child.setText(0, text)
-                    item.addChild(child)
-                    self.fill_item(child, val)
-        elif type(value) is list:
-            for val in value:
-                child = QTreeWidgetItem()
-                item.addChild(child)
-                if type(val) is OrderedDict:
-                    child.setText(0, '[' + str(value.index(val)) +']')
-                    self.fill_item(child, val)
-                elif type(val) is list:
-                    child.setText(0, '[' + str(value.index(val)) +']')
-                    self.fill_item(child, val)
-                else:
-                    child.setText(0, str(val))
-                    child.setExpanded(True)
-        else:
-            child = QTreeWidgetItem()
-            child.setText(0, str(value))
-            item.addChild(child)
-
-    def fill_widget(self, widget, value):
-        widget.clear()
-        self.fill_item(widget.invisibleRootItem(), value)
-
-    # colorize attributes
-    def getQColor(self, text):
-        for indicator in ['nil']:
-            if indicator in text.lower():
-                return QColor('lightgrey')
-        for indicator in ['gml:id', 'localid', 'identifier', 'xlink:href', 'xlink:type', 'namespace', 'codespace']:
-            if indicator in text.lower():
-                return QColor(244,134,66)
-        return QColor('green')
-
-    # search inside QTreeWidget
+    def loadDataset(self, filename, priority=0):
+        if filename in self.tasks:
+            return
+        if self.resolver:
+            self.resolver.registerFolder(os.path.dirname(os.path.abspath(filename)))
+        task = DatasetTask(filename, self.datasetLoaded, workers=self.workers, lazy=True,
+                           lazy_xlink_href=True, resolver=self.resolver,
+                           postprocessor=self.postprocessor, compact=self.compact)
+        self.tasks[filename] = task
+        QgsApplication.taskManager().addTask(task, priority)
+
+    def datasetLoaded(self, task):
+        self.tasks.pop(task.filename, None)
+        waiting = self.loading == task.filename and self.dlg.isVisible()
+        if task.dataset is None:
+            if waiting:
+                self.loading = None
+                self.showMessage(u'Loading %s cancelled' % os.path.basename(task.filename))
+                if task.error:
+                    QMessageBox.critical(self.dlg, 'Error', task.error)
+            return
+        self.cache.put(task.filename, task.dataset)
+        # maps built before may be of an older version of the file
+        self.removeIdMaps(task.filename)
+        self.logCacheStats()
+        if self.search_index:
+            self.indexDataset(task.dataset)
+        if self.resolver:
+            self.indexResolver()
+        layer = self.iface.activeLayer()
+        if waiting and layer and self.isGmlLayer(layer) and self.getFilename(layer) == task.filename:
+            self.show_Info()
+
+    def indexDataset(self, gml):
+        task = self.index_tasks.get(gml.filename)
+        if task is not None:
+            if task.dataset is gml:
+                return
+            # the file was reloaded
+            task.cancel()
+        task = SearchIndexTask(gml, self.datasetIndexed)
+        self.index_tasks[gml.filename] = task
+        QgsApplication.taskManager().addTask(task, -1)
+
+    def datasetIndexed(self, task):
+        if self.index_tasks.get(task.dataset.filename) is task:
+            del self.index_tasks[task.dataset.filename]
+
+    def indexResolver(self):
+        # references into files which aren't indexed yet stay unresolved meanwhile
+        if self.resolver_task is not None or self.resolver.isIndexed():
+            return
+        self.resolver_task = ResolverIndexTask(self.resolver, self.resolverIndexed)
+        QgsApplication.taskManager().addTask(self.resolver_task, -1)
+
+    def resolverIndexed(self, task):
+        self.resolver_task = None
+        # folders registered meanwhile
+        if task.status() == task.Complete and self.resolver:
+            self.indexResolver()
+
+    def cancelLoading(self):
+        task = self.tasks.get(self.loading)
+        if task:
+            task.cancel()
+
+    def showLoading(self, filename):
+        self.loading = filename
+        self.showMessage(u'Loading %s \u2026' % os.path.basename(filename))
+
+    def showMessage(self, text):
+        self.setTree(tree.FeatureTree.fromMessage(text))
+
+    def setTree(self, feature_tree):
+        self.selection_tree = feature_tree
+        self.query = None
+        self.showTree(feature_tree)
+
+    def showTree(self, feature_tree):
+        previous = self.model
+        self.model = FeatureModel(feature_tree, self.dlg)
+        self.filter_model.setMask(None)
+        self.filter_model.setSourceModel(self.model)
+        if previous is not None:
+            # otherwise the dialog keeps it, its tree and the datasets it references
+            previous.deleteLater()
+        # the selected features and their properties, deeper levels on demand
+        self.dlg.treeView.expandToDepth(1)
+
+    # search inside the tree
     def updateFeatureInfo(self):
-        self.displayFeatureInfo()
         query = str(self.dlg.lineEdit.text())
+        if self.model is None or not self.dlg.isVisible() or query == self.query:
+            return
+        self.query = query
+        if query.startswith('/'):
+            self.showQueryHint(query)
+            return
+        if self.model.tree is not self.selection_tree:
+            self.showTree(self.selection_tree)
         if query and len(query) >= 3:
-            root_item = self.dlg.treeWidget.invisibleRootItem()
-            self.removeChildren(root_item, query)
+            self.filter_model.setMask(self.model.match(query))
+            self.expandMatches()
+        else:
+            self.filter_model.setMask(None)
+
+    def expandMatches(self):
+        # expand everything that is left, except references which resolve when expanded
+        view = self.dlg.treeView
+        for node in self.model.tree.index.nodes:
+            if node.kind == tree.NODE and node.children and self.filter_model.isVisible(node):
+                view.expand(self.filter_model.mapFromSource(self.model.getIndex(node)))
+
+    def showQueryHint(self, text):
+        # typing only checks the query, the dataset is parsed by runQuery()
+        try:
+            query.compileQuery(text)
+        except query.QueryError as e:
+            self.showTree(tree.FeatureTree.fromMessage(e.message))
+            return
+        self.showTree(tree.FeatureTree.fromMessage(u'Press Enter to search the dataset for %s' % text))
 
-    def removeChildren(self, item, query):
-        if not item:
+    def runQuery(self):
+        text = str(self.dlg.lineEdit.text())
+        if self.model is None or not self.dlg.isVisible() or not text.startswith('/'):
+            return
+        self.filter_timer.stop()
+        self.query = text
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            self.showQueryResults(text)
+        finally:
+            QApplication.restoreOverrideCursor()
+
+    def showQueryResults(self, text):
+        # structured queries search the whole dataset, not just the selection
+        if self.gml is None:
+            return
+        try:
+            compiled = query.compileQuery(text)
+        except query.QueryError as e:
+            self.showTree(tree.FeatureTree.fromMessage(e.message))
+            return
+        features = OrderedDict()
+        for i, feature in enumerate(self.gml.queryFeatures(compiled), 1):
+            if i > self.max_query_results:
+                logging.info('More than %d features match %s' % (self.max_query_results, text))
+                break
+            features['Matching feature [' + str(i) + ']'] = feature
+        if features:
+            self.showTree(tree.FeatureTree(features, max_depth=self.reference_depth))
+        else:
+            self.showTree(tree.FeatureTree.fromMessage(u'No feature matches %s' % text))
+
+    def selectMatching(self):
+        # select the features of the whole dataset matching the search box,
+        # words are looked up in the word index, queries starting with / evaluated
+        layer = self.iface.activeLayer()
+        text = str(self.dlg.lineEdit.text()).strip()
+        if not (text and layer and self.isGmlLayer(layer) and self.gml is not None):
+            return
+        if self.getFilename(layer) != self.gml.filename:
+            return
+        task = self.index_tasks.get(self.gml.filename)
+        if not text.startswith('/') and task is not None and task.dataset is self.gml:
+            # don't build the word index a second time on the GUI thread
+            self.iface.messageBar().pushMessage('Complex GML Info', u'The search index is still being built',
+                                                Qgis.Info, 5)
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            if text.startswith('/'):
+                gml_ids = [pygml.getIds(feature) for feature in self.gml.queryFeatures(text)]
+                gml_ids = [ids[0] for ids in gml_ids if ids]
+            else:
+                gml_ids = self.gml.search(text)
+            fids = self.getIdMap(layer).getFeatureIds(gml_ids)
+        except query.QueryError as e:
+            QMessageBox.critical(self.dlg, 'Error', e.message)
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.iface.messageBar().pushMessage('Complex GML Info', u'%d feature(s) match %s' % (len(fids), text),
+                                            Qgis.Info, 5)
+        if fids:
+            layer.selectByIds(fids)
+            self.show_Info()
+
+    def removeIdMaps(self, filename):
+        # the file may have been rewritten with the same number of features
+        for layer_id in list(self.id_maps):
+            layer = QgsProject.instance().mapLayer(layer_id)
+            if layer is None or self.getFilename(layer) == filename:
+                del self.id_maps[layer_id]
+
+    def getIdMap(self, layer):
+        # built once per layer, again if features were added or removed
+        id_map = self.id_maps.get(layer.id())
+        if id_map is None or id_map.feature_count != layer.featureCount():
+            id_map = FeatureIdMap(layer)
+            self.id_maps[layer.id()] = id_map
+        return id_map
+
+    def flashFeature(self, index):
+        # flash the feature of the clicked row on the map
+        layer = self.iface.activeLayer()
+        if not (layer and self.isGmlLayer(layer) and self.gml is not None
+                and self.getFilename(layer) == self.gml.filename):
+            return
+        node = self.filter_model.mapToSource(index).internalPointer()
+        while node.parent.parent is not None:
+            node = node.parent
+        # e.g. "Loading ..." and other messages
+        gml_ids = pygml.getIds(node.value)
+        if not gml_ids:
             return
-        # process children first (post-order), iterate backwards to avoid index shift
-        for i in range(item.childCount() - 1, -1, -1):
-            self.removeChildren(item.child(i), query)
-
-        # if leaf, check query and remove if it doesn't match
-        if item.childCount() == 0:
-            path = self.buildPath(item)
-            if query.lower() not in path.lower():
-                parent = item.parent()
-                if parent:
-                    parent.removeChild(item)
-
-    def buildPath(self, item):
-        # Iterative version to avoid maximum recursion depth with deep trees
-        parts = []
-        cur = item
-        # climb up to root, collecting labels
-        while cur is not None:
-            parts.append(cur.text(0))
-            cur = cur.parent()
-        # original order was leaf -> ... -> root (no reverse)
-        return ' > '.join(parts)
+        fids = self.getIdMap(layer).getFeatureIds(gml_ids)
+        if fids:
+            self.iface.mapCanvas().flashFeatureIds(layer, fids)
@@ -11,4 +11,7 @@ __license__ = 'Apache 2.0'
 __copyright__ = 'Copyright 2015 Jürgen Weichand'
 
 from .pygml import *
+from .index import *
+from .cache import *
+from .resolver import *
 from .util import *
\ No newline at end of file
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+from collections import OrderedDict
+import logging
+
+
+class DatasetCache():
+    """Least recently used cache of Datasets keyed by file path.
+
+    Entries are evicted once there are more than max_entries or once the
+    estimated size of all datasets (Dataset.estimateSize()) exceeds
+    max_bytes. The most recently used dataset is always kept.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=2 ** 30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__datasets = OrderedDict()
+
+    def __contains__(self, path):
+        return path in self.__datasets
+
+    def __len__(self):
+        return len(self.__datasets)
+
+    def keys(self):
+        return list(self.__datasets.keys())
+
+    def get(self, path):
+        """Return the dataset of path and mark it as recently used, or None."""
+        dataset = self.__datasets.get(path)
+        if dataset is None:
+            self.misses += 1
+            logging.debug('Cache miss %s' % path)
+            return None
+        self.hits += 1
+        self.__datasets.move_to_end(path)
+        return dataset
+
+    def put(self, path, dataset):
+        self.__datasets[path] = dataset
+        self.__datasets.move_to_end(path)
+        self.shrink()
+
+    def remove(self, path):
+        """Evict the dataset of path, e.g. after its layer was removed."""
+        if self.__datasets.pop(path, None) is not None:
+            self.evictions += 1
+            logging.info('Evicted %s' % path)
+
+    def clear(self):
+        self.evictions += len(self.__datasets)
+        self.__datasets.clear()
+
+    def size(self):
+        return sum(dataset.estimateSize() for dataset in self.__datasets.values())
+
+    def shrink(self):
+        """Evict least recently used datasets until the budget is met."""
+        while len(self.__datasets) > 1 and (len(self.__datasets) > self.max_entries
+                                            or self.size() > self.max_bytes):
+            path, dataset = self.__datasets.popitem(last=False)
+            self.evictions += 1
+            logging.info('Evicted %s' % path)
+
+    def stats(self):
+        return 'datasets=%d, size=%.1f MB, hits=%d, misses=%d, evictions=%d' % (
+            len(self.__datasets), self.size() / 2.0 ** 20, self.hits, self.misses, self.evictions)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+from collections.abc import Mapping
+import sys
+
+
+class StringTable():
+    """Shares equal strings and key tuples between compact nodes.
+
+    Keys are interned, so all elements with the same name share one string,
+    and elements with the same keys in the same order share one tuple.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.keys = {}
+
+    def getString(self, value):
+        return self.strings.setdefault(value, value)
+
+    def getKeys(self, keys):
+        keys = tuple(sys.intern(key) for key in keys)
+        return self.keys.setdefault(keys, keys)
+
+
+class CompactNode(Mapping):
+    """Read-only mapping of an element, in place of an OrderedDict.
+
+    Keys and values are kept in two tuples, the keys tuple being shared by
+    all nodes with the same keys. Lookups are linear, elements have few keys.
+    """
+    __slots__ = ('_keys', '_values')
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def items(self):
+        return list(zip(self._keys, self._values))
+
+    def values(self):
+        return list(self._values)
+
+    def __repr__(self):
+        return 'CompactNode(%r)' % self.items()
+
+
+def compactFeature(feature, table=None, memo=None):
+    """Return a compact copy of a parsed feature, made of CompactNodes.
+
+    Lists stay lists and References stay References. Pass the same table to
+    share strings between features and the same memo, which maps the id()
+    of converted dicts to their nodes, to keep dicts shared by several
+    features (resolved references) shared, cycles included.
+    """
+    table = table if table is not None else StringTable()
+    memo = memo if memo is not None else {}
+    pending = []
+
+    def convert(value):
+        if type(value) is str:
+            return table.getString(value)
+        if type(value) is list:
+            return [convert(item) for item in value]
+        if isinstance(value, dict):
+            node = memo.get(id(value))
+            if node is None:
+                # values are converted afterwards, so cycles end here
+                node = CompactNode()
+                node._keys = table.getKeys(value.keys())
+                memo[id(value)] = node
+                pending.append((node, value))
+            return node
+        return value
+
+    result = convert(feature)
+    while pending:
+        node, value = pending.pop()
+        node._values = tuple(convert(item) for item in value.values())
+    return result
+
+
+def compactMembers(members, table, hrefs=None, start=0):
+    """Return compact copies of parsed members, see compactFeature().
+
+    The dicts of the (id, dict) pairs in hrefs[start:], see HrefSAXHandler,
+    must belong to members. They are replaced by their nodes, pairs of dicts
+    which were dropped are removed, so references can be resolved with
+    addItem() once the dicts are freed.
+    """
+    memo = {}
+    nodes = [compactFeature(member, table, memo) for member in members]
+    if hrefs is not None:
+        hrefs[start:] = [(source, memo[id(value)]) for source, value in hrefs[start:] if id(value) in memo]
+    return nodes
+
+
+def addItem(node, key, value, table):
+    """Add key and value to node, e.g. the resolved feature of a reference.
+
+    Only meant for nodes which are being built, they are read-only otherwise.
+    """
+    node._keys = table.getKeys(node._keys + (key,))
+    node._values = node._values + (value,)
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+from array import array
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import tempfile
+
+from .xmltodict import xmltodict
+from .util import getTempfile
+
+
+SIDECAR_VERSION = '3'
+SIGNATURE_PREFIX = 2 ** 16
+TAIL_SIZE = 2 ** 12
+
+
+class LoadCancelled(Exception):
+    """Raised when a progress callback returns False to stop loading."""
+
+
+def reportProgress(progress, done, total):
+    """Call progress(done, total) with the bytes parsed so far, if given."""
+    if progress is not None and progress(done, total) is False:
+        raise LoadCancelled()
+
+
+def isMemberContainer(full_name):
+    """True for base:member, member, featureMember and featureMembers elements."""
+    return full_name.rsplit(':', 1)[-1] in ('member', 'featureMember', 'featureMembers')
+
+
+class MemberIndex():
+    """Byte ranges of the members of a GML file and their @gml:id/@fid.
+
+    Every range covers the feature element itself, e.g. <ns:Parcel>..</ns:Parcel>,
+    so it can be parsed on its own. signature, hashes and context describe the
+    indexed file, so that appended members can be scanned incrementally.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+        self.starts = array('q')
+        self.ends = array('q')
+        self.ids = {}
+        # getSignature() of the indexed file
+        self.signature = None
+        # hashes of the first bytes and of the bytes before the end of the last member
+        self.hashes = None
+        # names of the elements enclosing the last member
+        self.context = ()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start, end, ids):
+        position = len(self.starts)
+        self.starts.append(start)
+        self.ends.append(end)
+        for id in ids:
+            # first occurrence wins, like Dataset.getFeature()
+            self.ids.setdefault(id, position)
+        return position
+
+    def getPosition(self, id):
+        return self.ids.get(id)
+
+    def getRange(self, position):
+        return self.starts[position], self.ends[position]
+
+    def getEnd(self):
+        return self.ends[-1] if len(self) else 0
+
+
+class MemberScanner():
+    """expat handler which records the byte range of every member.
+
+    Only element events are handled, no dicts or character data are built.
+    Byte positions are shifted by offset, e.g. when scanning the end of a file.
+    A member ends where the next event of the parser starts, as the end of
+    its end tag can't be told from the position of the end event, which is
+    the position of the start tag for empty elements <ns:Feature/>.
+    """
+
+    def __init__(self, parser, index, offset=0):
+        self.parser = parser
+        self.index = index
+        self.offset = offset
+        self.names = []
+        self.container_depth = None
+        self.start = None
+        self.ids = None
+        # (start, ids, context) of the member ended by the last event
+        self.pending = None
+
+    def xmlDecl(self, version, encoding, standalone):
+        self.index.encoding = encoding
+
+    def addPending(self):
+        start, ids, context = self.pending
+        self.pending = None
+        self.index.add(start, self.parser.CurrentByteIndex + self.offset, ids)
+        self.index.context = context
+
+    def default(self, data):
+        if self.pending is not None:
+            self.addPending()
+
+    def startElement(self, name, attrs):
+        if self.pending is not None:
+            self.addPending()
+        self.names.append(name)
+        depth = len(self.names)
+        if self.container_depth is None:
+            if isMemberContainer(name):
+                self.container_depth = depth
+        elif depth == self.container_depth + 1:
+            self.start = self.parser.CurrentByteIndex + self.offset
+            self.ids = [value for key, value in zip(attrs[0::2], attrs[1::2])
+                        if key in ('fid', 'gml:id')]
+
+    def endElement(self, name):
+        if self.pending is not None:
+            self.addPending()
+        depth = len(self.names)
+        if depth == self.container_depth:
+            self.container_depth = None
+        elif self.container_depth is not None and depth == self.container_depth + 1:
+            self.pending = (self.start, self.ids, self.names[:-1])
+        self.names.pop()
+
+    def scan(self, data, blocksize, progress=None):
+        for offset in range(0, len(data), blocksize):
+            self.parser.Parse(data[offset:offset + blocksize], False)
+            reportProgress(progress, min(offset + blocksize, len(data)), len(data))
+        self.parser.Parse(b'', True)
+
+
+def createScanner(index, offset=0):
+    parser = xmltodict.expat.ParserCreate(index.encoding)
+    scanner = MemberScanner(parser, index, offset)
+    parser.ordered_attributes = True
+    parser.XmlDeclHandler = scanner.xmlDecl
+    parser.StartElementHandler = scanner.startElement
+    parser.EndElementHandler = scanner.endElement
+    # character data, comments etc. are reported unbuffered to the default
+    # handler, which ends a pending member, entities aren't expanded,
+    # see xmltodict.create_parser()
+    parser.DefaultHandler = scanner.default
+    parser.ExternalEntityRefHandler = lambda *x: 1
+    return scanner
+
+
+def hashMembers(buffer, end):
+    return [hashlib.sha1(buffer[:min(SIGNATURE_PREFIX, end)]).hexdigest(),
+            hashlib.sha1(buffer[max(0, end - TAIL_SIZE):end]).hexdigest()]
+
+
+def scanMembers(filename, blocksize=2 ** 20, progress=None):
+    """Build a MemberIndex of filename in one fast pass.
+
+    progress(done, total) is called with the bytes scanned so far after
+    every block, loading is cancelled if it returns False.
+    """
+    logging.info('Scanning members of %s' % filename)
+    index = MemberIndex()
+    with open(filename, mode='rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            # empty files can't be mapped
+            return index
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            createScanner(index).scan(buffer, blocksize, progress)
+            index.hashes = hashMembers(buffer, index.getEnd())
+    logging.info('Found %d members' % len(index))
+    return index
+
+
+def appendMembers(filename, index, blocksize=2 ** 20, progress=None):
+    """Return a copy of index extended by the members appended to filename.
+
+    The file must have grown and its content up to the end of the last
+    indexed member must be unchanged (checked by hashes of its first bytes and
+    of the bytes before that end), otherwise None is returned.
+    """
+    end = index.getEnd()
+    if not (len(index) and index.signature and index.context):
+        return None
+    with open(filename, mode='rb') as f:
+        if os.fstat(f.fileno()).st_size <= int(index.signature['size']):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if hashMembers(buffer, end) != index.hashes:
+                return None
+            logging.info('Scanning members appended to %s' % filename)
+            appended = MemberIndex(index.encoding)
+            appended.starts.extend(index.starts)
+            appended.ends.extend(index.ends)
+            appended.ids.update(index.ids)
+            # reopen the elements enclosing the last member, then continue after it
+            context = b''.join(b'<' + name.encode(index.encoding or 'utf-8') + b'>'
+                               for name in index.context)
+            scanner = createScanner(appended, end - len(context))
+            try:
+                scanner.scan(context + buffer[end:], blocksize, progress)
+            except xmltodict.expat.ExpatError as e:
+                logging.info('Unable to scan appended members: %s' % e)
+                return None
+            appended.hashes = hashMembers(buffer, appended.getEnd())
+    logging.info('Found %d appended members' % (len(appended) - len(index)))
+    return appended
+
+
+def getSignature(filename):
+    """Return size, mtime and a hash of the first bytes of filename."""
+    stat = os.stat(filename)
+    with open(filename, mode='rb') as f:
+        head = hashlib.sha1(f.read(SIGNATURE_PREFIX)).hexdigest()
+    return {'size': str(stat.st_size), 'mtime': str(stat.st_mtime_ns), 'head': head}
+
+
+def getSidecar(filename):
+    """Return the path of the SQLite index file of filename in the temp dir."""
+    key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+    return getTempfile('pygml-%s.sqlite' % key)
+
+
+def saveMembers(filename, index):
+    """Persist index as sidecar of filename, replacing an older one."""
+    sidecar = getSidecar(filename)
+    meta = dict(index.signature)
+    meta['version'] = SIDECAR_VERSION
+    meta['path'] = os.path.abspath(filename)
+    meta['encoding'] = index.encoding or ''
+    meta['hashes'] = json.dumps(index.hashes)
+    meta['context'] = json.dumps(list(index.context))
+    # unique, several threads may save the same index
+    handle, tmpfile = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(sidecar) + '.',
+                                       dir=os.path.dirname(sidecar))
+    os.close(handle)
+    try:
+        connection = sqlite3.connect(tmpfile)
+        try:
+            with connection:
+                connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value)')
+                connection.execute('CREATE TABLE ids (id TEXT PRIMARY KEY, position INTEGER)')
+                connection.executemany('INSERT INTO meta VALUES (?, ?)', list(meta.items()) + [
+                    ('starts', index.starts.tobytes()), ('ends', index.ends.tobytes())])
+                connection.executemany('INSERT INTO ids VALUES (?, ?)', index.ids.items())
+        finally:
+            connection.close()
+        os.replace(tmpfile, sidecar)
+    except Exception:
+        os.remove(tmpfile)
+        raise
+    logging.info('Saved member index of %s to %s' % (filename, sidecar))
+
+
+def loadSavedMembers(filename):
+    """Return the persisted index of filename or None.
+
+    The index may be outdated, compare its signature with getSignature().
+    """
+    sidecar = getSidecar(filename)
+    if not os.path.exists(sidecar):
+        return None
+    connection = sqlite3.connect(sidecar)
+    try:
+        meta = dict(connection.execute('SELECT key, value FROM meta'))
+        if meta.get('version') != SIDECAR_VERSION or meta.get('path') != os.path.abspath(filename):
+            return None
+        index = MemberIndex(meta['encoding'] or None)
+        index.signature = {key: meta[key] for key in ('size', 'mtime', 'head')}
+        index.hashes = json.loads(meta['hashes'])
+        index.context = json.loads(meta['context'])
+        index.starts.frombytes(meta['starts'])
+        index.ends.frombytes(meta['ends'])
+        index.ids = dict(connection.execute('SELECT id, position FROM ids'))
+    finally:
+        connection.close()
+    logging.info('Loaded member index of %s from %s' % (filename, sidecar))
+    return index
+
+
+def loadMembers(filename, persistent=True, previous=None, progress=None):
+    """Return the current MemberIndex of filename.
+
+    previous, or else the sidecar of filename, is returned if the file is
+    unchanged, and extended by appendMembers() if the file was appended to.
+    Otherwise the file is scanned again. Problems with the sidecar are logged
+    and never keep the index from being built.
+    """
+    signature = getSignature(filename)
+    index = previous
+    if index is None and persistent:
+        try:
+            index = loadSavedMembers(filename)
+        except (sqlite3.Error, KeyError, ValueError) as e:
+            logging.warning('Unable to read member index of %s: %s' % (filename, e))
+    if index is not None:
+        if index.signature == signature:
+            return index
+        index = appendMembers(filename, index, progress=progress)
+    if index is None:
+        index = scanMembers(filename, progress=progress)
+    index.signature = signature
+    if persistent:
+        try:
+            saveMembers(filename, index)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning('Unable to save member index of %s: %s' % (filename, e))
+    return index
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import logging
+import multiprocessing
+import os
+import pickle
+import re
+import sys
+
+from .xmltodict import xmltodict
+from .index import reportProgress
+from .pygml import ChunkError, MemberSAXHandler, getIds, postprocessor
+from .search import iterWords
+
+
+# start tag of the root element, skipping the XML declaration, comments and doctype
+ROOT_TAG = re.compile(rb'<(?![?!])(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+
+
+def getPythonExecutable():
+    """Return the Python interpreter to spawn worker processes with.
+
+    Embedded in an application, e.g. QGIS on Windows and macOS,
+    sys.executable is the application, so the interpreter is looked up in
+    sys.exec_prefix. OSError is raised if there is none.
+    """
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    version = 'python%d.%d' % sys.version_info[:2]
+    for path in (os.path.join(sys.exec_prefix, 'python.exe'),
+                 os.path.join(sys.exec_prefix, 'bin', version),
+                 os.path.join(sys.exec_prefix, 'bin', 'python3')):
+        if os.path.isfile(path):
+            return path
+    raise OSError('No Python interpreter found in %s' % sys.exec_prefix)
+
+
+@functools.lru_cache(maxsize=None)
+def getSpawnContext():
+    """Return the multiprocessing context to spawn worker processes with.
+
+    Its executable is process-wide, so it is only set, once, if the
+    interpreter isn't sys.executable.
+    """
+    context = multiprocessing.get_context('spawn')
+    executable = getPythonExecutable()
+    if executable != sys.executable:
+        context.set_executable(executable)
+    return context
+
+
+def getRootTag(buffer):
+    """Return the start tag of the root element, with its namespace declarations."""
+    match = ROOT_TAG.search(buffer)
+    if match is None:
+        raise ChunkError('No root element found')
+    return match.group(0)
+
+
+def splitMembers(members, count):
+    """Split members, a MemberIndex, into up to count runs of about the
+    same number of bytes. Return (first, last) member positions."""
+    if not len(members):
+        return []
+    begin = members.starts[0]
+    total = members.getEnd() - begin
+    runs = []
+    first = 0
+    for i in range(1, count + 1):
+        last = min(bisect_left(members.ends, begin + total * i // count), len(members) - 1)
+        if last >= first:
+            runs.append((first, last))
+            first = last + 1
+    return runs
+
+
+def getChunks(buffer, members, count):
+    """Return (start, end, prefix, suffix) of up to count chunks of members.
+
+    Every chunk is the slice of the file from the start of its first to the
+    end of its last member. prefix re-opens the root element, including its
+    namespace declarations, and the elements enclosing the members, suffix
+    closes them, so each chunk can be parsed as a document of its own.
+    """
+    encoding = members.encoding or 'utf-8'
+    context = [name.encode(encoding) for name in members.context]
+    if not context:
+        raise ChunkError('Unknown member context')
+    prefix = getRootTag(buffer) + b''.join(b'<' + name + b'>' for name in context[1:])
+    suffix = b''.join(b'</' + name + b'>' for name in reversed(context))
+    return [(members.starts[first], members.ends[last], prefix, suffix)
+            for first, last in splitMembers(members, count)]
+
+
+def parseChunk(filename, encoding, chunk, hrefs, postprocessor=postprocessor):
+    """Parse a chunk of getChunks(), return its features and, if hrefs,
+    the dicts with an @xlink:href (see HrefSAXHandler)."""
+    start, end, prefix, suffix = chunk
+    with open(filename, mode='rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    features = []
+    hrefs = [] if hrefs else None
+    handler = MemberSAXHandler(features.append, hrefs, postprocessor=postprocessor)
+    parser = xmltodict.create_parser(handler, encoding)
+    parser.Parse(prefix, False)
+    parser.Parse(data, False)
+    parser.Parse(suffix, True)
+    return features, hrefs
+
+
+def indexChunk(filename, encoding, chunk, postprocessor=postprocessor):
+    """Return the first id and words of every feature of a chunk, see InvertedIndex."""
+    features, hrefs = parseChunk(filename, encoding, chunk, False, postprocessor)
+    result = []
+    for feature in features:
+        ids = getIds(feature)
+        result.append((ids[0] if ids else None, list(set(iterWords(feature)))))
+    return result
+
+
+def mapChunks(function, filename, buffer, members, workers, args=(), progress=None):
+    """Yield function(filename, encoding, chunk, *args) for the chunks of
+    members, computed by workers processes, in the order of the file.
+
+    The file is split into 4 chunks per worker to balance the load.
+    progress(done, total) is called with the bytes of the chunks done so far.
+    Processes are spawned, as forking is unsafe when threads are running,
+    e.g. in a QgsTask, see getSpawnContext(). pickle.PicklingError is raised
+    before if args can't be sent to them.
+    """
+    try:
+        pickle.dumps(args)
+    except (AttributeError, TypeError) as e:
+        # e.g. local functions
+        raise pickle.PicklingError(str(e))
+    chunks = getChunks(buffer, members, workers * 4)
+    total = sum(end - start for start, end, prefix, suffix in chunks)
+    logging.info('Parsing %d chunks of %s in %d processes' % (len(chunks), filename, workers))
+    done = 0
+    with ProcessPoolExecutor(workers, mp_context=getSpawnContext()) as executor:
+        futures = [executor.submit(function, filename, members.encoding, chunk, *args) for chunk in chunks]
+        try:
+            for chunk, future in zip(chunks, futures):
+                yield future.result()
+                done += chunk[1] - chunk[0]
+                reportProgress(progress, done, total)
+        finally:
+            for future in futures:
+                future.cancel()
@@ -11,15 +11,26 @@ __license__ = 'Apache 2.0'
 __copyright__ = 'Copyright 2015 Jürgen Weichand'
 
 
-from collections import OrderedDict
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 import logging
+import mmap
 import os
+import pickle
 import re
 import tempfile
 import json
 
 #from extlib.pygml.xmltodict import xmltodict
 from .xmltodict import *
+from .compact import CompactNode, StringTable, addItem, compactMembers
+from .index import LoadCancelled, isMemberContainer, loadMembers, reportProgress
+
+
+# key under which the referenced feature is added next to an @xlink:href
+RESOLVED_KEY = '@xlink:href [resolved]'
 
 
 class GmlException(Exception):
@@ -39,117 +50,575 @@ def getTempfile(filename):
     return tmpfile
 
 
+def getProperties(feature):
+    """Return the properties of a member, e.g. {'@gml:id': ..., ...} of {'ns:Parcel': {...}}."""
+    if isinstance(feature, Mapping) and feature:
+        properties = next(iter(feature.values()))
+        if isinstance(properties, Mapping):
+            return properties
+    return {}
+
+
+def getIds(feature):
+    """Return the @fid and @gml:id values of a member."""
+    properties = getProperties(feature)
+    return [properties[key] for key in ('@fid', '@gml:id') if key in properties]
+
+
+geometry_name_matcher = re.compile('(?:^|:)(?:geometry|position|the_geom)', re.IGNORECASE)
+
+
+class PostprocessorRules():
+    """Postprocessor of parsed keys, given by a table of rules.
+
+    In this order, the namespace prefixes of strip are removed from all
+    keys, those of unprefix from the names of the feature collection and
+    its members (keys containing 'feature' or 'member'), keys are renamed
+    by rename and keys in drop or matching drop_pattern, by default the
+    geometry properties, are dropped together with their values.
+
+    The rules are compiled once and the result is memoised for every
+    distinct key, so the rules cost nothing per element. Pass an instance,
+    e.g. with more geometry property names to drop, as postprocessor to
+    Dataset or iterFeatures().
+    """
+    # the result only depends on key, so SAX handlers call it once per distinct key
+    key_only = True
+
+    def __init__(self, strip=('wfs:',), unprefix=('gml:',), rename=None, drop=(),
+                 drop_pattern=geometry_name_matcher):
+        self.strip = tuple(strip)
+        self.unprefix = tuple(unprefix)
+        self.rename = dict(rename or {})
+        self.drop = frozenset(drop)
+        self.drop_pattern = re.compile(drop_pattern) if isinstance(drop_pattern, str) else drop_pattern
+        self.__keys = {}
+
+    def getKey(self, key):
+        """Return the new key of key, None if it is dropped."""
+        try:
+            return self.__keys[key]
+        except KeyError:
+            pass
+        new_key = key
+        for prefix in self.strip:
+            new_key = new_key.replace(prefix, '')
+        lower = new_key.lower()
+        if 'feature' in lower or 'member' in lower:
+            for prefix in self.unprefix:
+                new_key = new_key.replace(prefix, '')
+        new_key = self.rename.get(new_key, new_key)
+        if new_key in self.drop or (self.drop_pattern is not None and self.drop_pattern.search(new_key)):
+            new_key = None
+        self.__keys[key] = new_key
+        return new_key
+
+    def __call__(self, path, key, value):
+        key = self.getKey(key)
+        if key is not None:
+            return key, value
+
+
+postprocessor = PostprocessorRules()
+
+
+class HrefSAXHandler(xmltodict._DictSAXHandler):
+    """SAX handler which collects every dict with an @xlink:href attribute.
+
+    (gml id of the feature, dict) pairs are appended to hrefs while parsing,
+    so references can be resolved afterwards without walking the parsed
+    features again.
+    """
+
+    def __init__(self, hrefs=None, **kwargs):
+        super().__init__(**kwargs)
+        self.hrefs = hrefs
+        self.href_key = self.attr_prefix + 'xlink:href'
+
+    def startElement(self, full_name, attrs):
+        super().startElement(full_name, attrs)
+        if self.hrefs is not None and len(self.path) > self.item_depth \
+                and self.item is not None and self.href_key in self.item:
+            # raw attributes of the feature element
+            attrs = self.path[self.item_depth][1] or {}
+            self.hrefs.append((attrs.get('gml:id', attrs.get('fid')), self.item))
+
+
+def parseFragment(data, encoding=None, hrefs=None, postprocessor=postprocessor):
+    """Parse a single feature element, e.g. a slice of a MemberIndex."""
+    handler = HrefSAXHandler(hrefs, postprocessor=postprocessor)
+    parser = xmltodict.create_parser(handler, encoding)
+    parser.Parse(data, True)
+    return handler.item
+
+
+class MemberSAXHandler(HrefSAXHandler):
+    """SAX handler which builds one member at a time.
+
+    Members are the children of base:member, member and featureMember
+    elements (GML 3.2 / 2.0) and the children of featureMembers (GML 3.1).
+    Every member is passed to member_callback as {'ns:FeatureType': {...}}
+    and dropped afterwards, everything outside of members is skipped.
+    """
+    no_item_depth = float('inf')
+
+    def __init__(self, member_callback, hrefs=None, **kwargs):
+        super().__init__(hrefs, item_depth=self.no_item_depth, **kwargs)
+        self.member_callback = member_callback
+
+    def startElement(self, full_name, attrs):
+        if self.item_depth == self.no_item_depth and isMemberContainer(full_name):
+            self.item_depth = len(self.path) + 1
+        super().startElement(full_name, attrs)
+
+    def endElement(self, full_name):
+        depth = len(self.path)
+        super().endElement(full_name)
+        if depth == self.item_depth + 1:
+            if self.item:
+                self.member_callback(self.item)
+            self.item = None
+            self.data = []
+        elif depth == self.item_depth:
+            self.item_depth = self.no_item_depth
+
+
+def iterFeatures(filename, postprocessor=postprocessor, blocksize=2 ** 16, hrefs=None,
+                 progress=None, table=None):
+    """Parse a GML file and yield its members one at a time.
+
+    Memory use is bounded by the largest member instead of the whole file.
+    If hrefs is a list, all dicts with an @xlink:href are appended to it.
+    progress(done, total) is called with the bytes parsed so far after every
+    block, parsing is cancelled with LoadCancelled if it returns False.
+    With a StringTable, every member is compacted as soon as it is parsed
+    and the dicts in hrefs are replaced by their nodes, see compactMembers().
+    """
+    members = deque()
+    callback = members.append
+    if table is not None:
+        done = len(hrefs) if hrefs is not None else 0
+
+        def callback(member):
+            nonlocal done
+            # the references of this member were appended last
+            members.extend(compactMembers([member], table, hrefs, done))
+            done = len(hrefs) if hrefs is not None else 0
+    handler = MemberSAXHandler(callback, hrefs, postprocessor=postprocessor)
+    parser = xmltodict.create_parser(handler)
+    logging.info('Open file %s' % filename)
+    with open(filename, mode='rb') as f:
+        total = os.fstat(f.fileno()).st_size
+        while True:
+            block = f.read(blocksize)
+            parser.Parse(block, not block)
+            reportProgress(progress, f.tell(), total)
+            while members:
+                yield members.popleft()
+            if not block:
+                break
+
+
+class Reference(Mapping):
+    """Proxy of a feature referenced by xlink:href.
+
+    The feature is looked up (and parsed, for lazy datasets) only when the
+    proxy is accessed, e.g. when its node in the tree is expanded.
+    """
+
+    def __init__(self, dataset, id):
+        self.dataset = dataset
+        self.id = id
+
+    def resolve(self):
+        return self.dataset.getFeature(self.id)
+
+    def __getitem__(self, key):
+        return (self.resolve() or {})[key]
+
+    def __iter__(self):
+        return iter(self.resolve() or {})
+
+    def __len__(self):
+        return len(self.resolve() or {})
+
+    def __repr__(self):
+        return 'Reference(%r)' % self.id
+
+
+class ChunkError(GmlException):
+    """Raised when a file can't be split into chunks to parse in parallel."""
+
+
+# errors of parsing in parallel, after which the file is parsed at once:
+# chunks which can't be split or parsed on their own, failing processes and
+# arguments which can't be pickled, e.g. a local postprocessor
+PARALLEL_ERRORS = (ChunkError, xmltodict.expat.ExpatError, BrokenProcessPool, OSError,
+                   pickle.PicklingError)
+
+
 class Dataset():
     logformat = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     logfile = getTempfile('pygml.log')
     logging.basicConfig(filename=logfile, level=logging.ERROR, format=logformat)
     logging.debug(dir())
-    geometry_name_matcher = re.compile('(?:^|:)(?:geometry|position|the_geom)', re.IGNORECASE)
-
-    def __init__(self, filename, resolve_xlink_href=True):
-
-        def is_geometry(key):
-            return self.geometry_name_matcher.search(key) != None
-
-        def postprocessor(path, key, value):
-            # remove wfs namespace
-            key = key.replace('wfs:', '')
-
-            # normalize FeatureCollection, member, featureMember, featureMembers
-            if 'feature' in str(key.lower()) or 'member' in str(key.lower()):
-                key = key.replace('gml:', '')
-
-            if not is_geometry(key):
-                return key, value
-
-        features = {}
-        f = open(filename, mode='rb')
-        logging.info('Open file %s' % filename)
-        features = xmltodict.parse(f, postprocessor=postprocessor)
-        f.close()
-
-        # logging.info(json.dumps(features, indent=3))
-        logging.debug('Container type(%s)' % str(type(features)))
-        logging.debug('Container %s' % [features.keys()][0])
-
-        # convert single feature (count=1 or maxFeatures=1) to list
-        def prepare(features):
-            if type(features) == OrderedDict:
-                return [features]
-            return features
-
+    geometry_name_matcher = geometry_name_matcher
+    postprocessor = postprocessor
+    # estimated memory use of parsed dicts relative to the GML bytes
+    size_factor = 15
+    compact_size_factor = 4
+
+    def __init__(self, filename, resolve_xlink_href=True, streaming=False, lazy=False,
+                 persistent_index=True, lazy_xlink_href=False, resolver=None, progress=None,
+                 workers=None, compact=False, postprocessor=None):
+        """Parse filename into a list of features.
+
+        With streaming=True, nothing is kept in memory: the file is parsed
+        again, member by member, by every call of iterFeatures(), getFeatures()
+        and getFeature(). xlink:href references are not resolved then.
+
+        With lazy=True, only the byte range of every member is recorded by a
+        fast first pass. Features are parsed from their slice of the file when
+        they are requested (together with the features they reference).
+        The index is kept in a sidecar file in the temp dir unless
+        persistent_index=False, and reused as long as the file is unchanged.
+
+        With lazy_xlink_href=True, '@xlink:href [resolved]' is a Reference
+        to the feature, which is only looked up when it is accessed.
+
+        resolver, e.g. a pygml.Resolver, is asked for references to other
+        files ('file.gml#id') and for ids which are not part of this file.
+
+        progress(done, total) is called with the bytes parsed while loading,
+        loading is cancelled with LoadCancelled if it returns False.
+
+        With workers > 1, the file is split at member boundaries, found by
+        the scan of lazy mode, and the chunks are parsed by as many processes.
+        This applies to loading without lazy or streaming and to building
+        the search index. If a chunk can't be parsed on its own, the file is
+        parsed at once.
+
+        With compact=True, features are kept as read-only CompactNodes
+        instead of OrderedDicts, sharing equal names and texts, which takes
+        far less memory. Every member is compacted as soon as it is parsed
+        (or a chunk of members, when parsing in parallel), the features
+        parsed by lazy mode as well. This doesn't apply to streaming.
+
+        postprocessor, e.g. PostprocessorRules with more properties to drop,
+        replaces the default rules for the keys of all parsed features.
+        """
+        self.filename = filename
+        self.streaming = streaming
+        self.lazy = lazy
+        self.resolve_xlink_href = resolve_xlink_href
+        self.persistent_index = persistent_index
+        self.lazy_xlink_href = lazy_xlink_href
+        self.resolver = resolver
+        self.workers = workers
+        self.compact = compact
+        if postprocessor is not None:
+            self.postprocessor = postprocessor
+        self.__members = None
+        self.__mmap = None
+        self.__load(progress=progress)
+
+    def __load(self, members=None, progress=None):
+        self.__stat = self.__getStat()
         self.__features = None
-
-        # INSPIRE GML 3.2
-        if 'base:SpatialDataSet' in features:
-            self.__features = features['base:SpatialDataSet']['base:member']
-
-        # WFS or GML
-        if 'FeatureCollection' in features:
-
-            # GML 3.2
-            if 'member' in features['FeatureCollection']:
-                self.__features = prepare(features['FeatureCollection']['member'])
-                try:
-                    self.__features.extend(features['FeatureCollection']['additionalObjects']['SimpleFeatureCollection']['member'])
-                except KeyError:
-                    pass
-            # GML 3.1
-            if 'featureMembers' in features['FeatureCollection']:
-                list = []
-                for key in features['FeatureCollection']['featureMembers'].keys():
-                    for value in features['FeatureCollection']['featureMembers'][key]:
-                        dict = OrderedDict()
-                        dict[key] = value
-                        list.append(dict)
-                self.__features = list
-            # GML 2.0
-            if 'featureMember' in features['FeatureCollection']:
-                self.__features = prepare(features['FeatureCollection']['featureMember'])
+        self.__index = None
+        self.__file_size = self.__stat[0]
+        self.__materialised = {}
+        self.__materialised_bytes = 0
+        self.__hrefs = []
+        self.__search = None
+        self.__table = StringTable() if self.compact else None
+        self.resolved = 0
+        self.unresolved = 0
+
+        if self.streaming:
+            if self.resolve_xlink_href:
+                logging.info('Streaming mode, xlink:href references are not resolved')
+            return
+
+        if self.lazy:
+            self.__members = loadMembers(self.filename, self.persistent_index, members, progress)
+            if not len(self.__members):
+                raise GmlException('Unsupported GML-Container!')
+            return
+
+        hrefs = self.__hrefs if self.resolve_xlink_href else None
+        self.__features = None
+        if self.workers and self.workers > 1:
+            from .parallel import parseChunk
+            try:
+                self.__features = []
+                for features, chunk_hrefs in self.__mapChunks(parseChunk, (hrefs is not None, self.postprocessor), progress):
+                    if self.compact:
+                        features = compactMembers(features, self.__table, chunk_hrefs)
+                    self.__features.extend(features)
+                    if hrefs is not None:
+                        hrefs.extend(chunk_hrefs)
+            except PARALLEL_ERRORS as e:
+                logging.warning('Unable to parse %s in parallel: %s' % (self.filename, e))
+                self.__features = None
+                self.__hrefs = hrefs = [] if hrefs is not None else None
+        if self.__features is None:
+            self.__features = list(iterFeatures(self.filename, self.postprocessor, hrefs=hrefs,
+                                                progress=progress, table=self.__table))
 
         if not self.__features:
             raise GmlException('Unsupported GML-Container!')
 
         logging.debug('Container type(%s)' % str(type(self.__features)))
 
-        if resolve_xlink_href:
-            logging.info('Resolving xlink:href references')
-            self.__resolve(self.__features)
-
-    def getFeatures(self):
-        logging.debug('getFeatures()')
-        logging.debug('type(getFeatures()) = %s' % type(self.__features))
-        return self.__features
+        # index features by @gml:id and @fid, first occurrence wins
+        self.__index = {}
+        for feature in self.__features:
+            for gml_id in getIds(feature):
+                self.__index.setdefault(gml_id, feature)
+        logging.debug('Indexed %d ids' % len(self.__index))
+
+        if self.resolve_xlink_href:
+            self.__resolve()
+        self.__hrefs = []
+
+    def __getStat(self):
+        stat = os.stat(self.filename)
+        return stat.st_size, stat.st_mtime_ns
+
+    def isModified(self):
+        """True if size or mtime of the file changed since it was loaded."""
+        return self.__getStat() != self.__stat
+
+    def refresh(self):
+        """Reload the dataset if its file was modified, return True if so.
+
+        Lazy datasets only scan the members appended to the file if the
+        indexed part is unchanged, every other change reloads the file.
+        """
+        if not self.isModified():
+            return False
+        logging.info('%s was modified, reloading' % self.filename)
+        self.__load(self.__members)
+        return True
+
+    def iterFeatures(self):
+        """Yield all features, parsing the file again in streaming and lazy mode."""
+        if self.streaming:
+            return iterFeatures(self.filename, self.postprocessor)
+        if self.lazy:
+            return self.__iterMembers()
+        return iter(self.__features)
+
+    def getSearchIndex(self, progress=None):
+        """Return the InvertedIndex of all features, building it on first use.
+
+        The file is parsed once more, in a single streaming pass without
+        resolving references. progress(done, total) is called with the bytes
+        parsed so far, building is cancelled with LoadCancelled if it returns False.
+        """
+        if self.__search is None:
+            from .search import InvertedIndex
+            logging.info('Indexing words of %s' % self.filename)
+            index = None
+            if self.workers and self.workers > 1:
+                from .parallel import indexChunk
+                try:
+                    index = InvertedIndex()
+                    for result in self.__mapChunks(indexChunk, (self.postprocessor,), progress):
+                        for id, words in result:
+                            index.addWords(id, words)
+                except PARALLEL_ERRORS as e:
+                    logging.warning('Unable to index %s in parallel: %s' % (self.filename, e))
+                    index = None
+            if index is None:
+                index = InvertedIndex()
+                for feature in iterFeatures(self.filename, self.postprocessor, progress=progress):
+                    ids = getIds(feature)
+                    index.add(ids[0] if ids else None, feature)
+            logging.info('Indexed %d words of %d features' % (len(index.postings), len(index)))
+            self.__search = index
+        return self.__search
+
+    def search(self, text):
+        """Return the ids of the features containing all words of text.
+
+        Words are matched against element and attribute names and values,
+        ignoring case, the last word also matches longer words.
+        """
+        index = self.getSearchIndex()
+        ids = (index.ids[position] for position in index.search(text))
+        return [id for id in ids if id is not None]
+
+    def queryFeatures(self, query):
+        """Return an iterator over the features matching query.
+
+        query is a query string, see pygml.query.compileQuery(), or a compiled
+        Query. All features are checked, so lazy datasets parse every member.
+        """
+        if isinstance(query, str):
+            from .query import compileQuery
+            query = compileQuery(query)
+        return (feature for feature in self.iterFeatures() if query.matches(feature))
+
+    def getFeatures(self, ids=None):
+        """Return all features or, if ids is given, the features with these ids.
+
+        The result for ids is a list in the same order as ids, containing
+        None for every id that is not part of the dataset. In streaming mode
+        all features are returned as an iterator and ids are looked up in a
+        single pass over the file.
+        """
+        if ids is None:
+            logging.debug('getFeatures()')
+            if self.streaming:
+                return self.iterFeatures()
+            if self.lazy:
+                return list(self.iterFeatures())
+            logging.debug('type(getFeatures()) = %s' % type(self.__features))
+            return self.__features
+        logging.debug('getFeatures(%s)' % ids)
+        if self.streaming:
+            return self.__scan(ids)
+        if self.lazy:
+            with self.__mapped():
+                features = [self.__materialise(id) for id in ids]
+                self.__resolve()
+            return features
+        return [self.__index.get(id) for id in ids]
 
-    #TODO: auf das erste tupe zugreifen und prüfen ob @fid oder @gml:id enthalten ist ('@gml:id','Name')
-    #        - scheint nicht ordnungsgemäß auf das dict zuzugreifen
     def getFeature(self, id):
         logging.debug('getFeature(%s)' % id)
-        features = self.getFeatures()
-        
-        for feature in features:
-            for gml_id in ['@fid', '@gml:id']:
-                if gml_id in list(feature.values())[0]:
-                    if list(feature.values())[0][gml_id] == id:
-                        return feature
-        return None
-
-    def __resolve(self, value):
-        if type(value) == OrderedDict:
-            for key, val in sorted(value.items()):
-                if 'xlink:href' in key:
-                    logging.debug('Resolving %s' % val)
-                    val = val.replace('#', '')
-                    feature = self.getFeature(val)
-                    if feature:
-                        logging.debug('Successful resolved %s' % val)
-                        value['@xlink:href [resolved]'] = feature
-                    else:
-                        logging.debug('Unable to resolve %s' % val)
-                        pass
+        if self.streaming:
+            return self.__scan([id])[0]
+        if self.lazy:
+            return self.getFeatures([id])[0]
+        return self.__index.get(id)
+
+    def hasFeature(self, id):
+        """True if the dataset contains a feature with this id, without parsing it."""
+        if self.streaming:
+            return self.getFeature(id) is not None
+        if self.lazy:
+            return self.__members.getPosition(id) is not None
+        return id in self.__index
+
+    def estimateSize(self):
+        """Estimate the memory used by this dataset in bytes."""
+        size = self.__search.estimateSize() if self.__search is not None else 0
+        if self.streaming:
+            return size
+        factor = self.compact_size_factor if self.compact else self.size_factor
+        if self.lazy:
+            members = self.__members
+            return (size + members.starts.itemsize * len(members) * 2 + 100 * len(members.ids)
+                    + factor * self.__materialised_bytes)
+        return size + factor * self.__file_size
+
+    def __scan(self, ids):
+        found = dict.fromkeys(ids)
+        missing = len(found)
+        for feature in self.iterFeatures():
+            for gml_id in getIds(feature):
+                if gml_id in found and found[gml_id] is None:
+                    found[gml_id] = feature
+                    missing -= 1
+            if not missing:
+                break
+        return [found[id] for id in ids]
+
+    def __mapChunks(self, function, args, progress):
+        from .parallel import mapChunks
+        members = self.__members
+        if members is None:
+            members = loadMembers(self.filename, self.persistent_index)
+        if not len(members):
+            raise ChunkError('No members found')
+        # a map of its own, the word index may be built in another thread
+        with open(self.filename, mode='rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield from mapChunks(function, self.filename, buffer, members, self.workers, args, progress)
+
+    @contextmanager
+    def __mapped(self):
+        # map the file once for nested calls, unmap it afterwards
+        if self.__mmap is not None:
+            yield self.__mmap
+            return
+        with open(self.filename, mode='rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                self.__mmap = buffer
+                try:
+                    yield buffer
+                finally:
+                    self.__mmap = None
+
+    def __parse(self, position):
+        start, end = self.__members.getRange(position)
+        hrefs = self.__hrefs if self.resolve_xlink_href else None
+        done = len(hrefs) if hrefs is not None else 0
+        feature = parseFragment(self.__mmap[start:end], self.__members.encoding, hrefs, self.postprocessor)
+        if self.compact:
+            feature = compactMembers([feature], self.__table, hrefs, done)[0]
+        return feature
+
+    def __materialise(self, id):
+        position = self.__members.getPosition(id)
+        if position is None:
+            return None
+        if position not in self.__materialised:
+            self.__materialised[position] = self.__parse(position)
+            start, end = self.__members.getRange(position)
+            self.__materialised_bytes += end - start
+        return self.__materialised[position]
+
+    def __iterMembers(self):
+        with self.__mapped():
+            for position in range(len(self.__members)):
+                feature = self.__materialised.get(position)
+                if feature is None:
+                    feature = self.__parse(position)
+                    self.__resolve()
+                yield feature
+
+    def __lookup(self, href):
+        # '#id' and bare ids are looked up in this file, ids which are not
+        # found and 'file.gml#id' are looked up by the resolver, if any
+        path, sep, id = href.rpartition('#')
+        dataset = self
+        if path and os.path.basename(path) != os.path.basename(self.filename):
+            dataset = None
+        if dataset is None or not self.hasFeature(id):
+            if self.resolver is None or (sep and not path):
+                return None
+            dataset = self.resolver.getTarget(href, self.filename)
+            if dataset is None:
+                return None
+        if self.lazy_xlink_href:
+            return Reference(dataset, id)
+        if dataset is self and self.lazy:
+            return self.__materialise(id)
+        return dataset.getFeature(id)
+
+    def __resolve(self):
+        # resolve the collected references, in lazy mode this may parse
+        # referenced features and collect their references in turn
+        logging.info('Resolving xlink:href references')
+        resolved = unresolved = 0
+        hrefs = self.__hrefs
+        while hrefs:
+            value = hrefs.pop()[1]
+            href = value['@xlink:href']
+            feature = self.__lookup(href)
+            if feature is not None:
+                if type(value) is CompactNode:
+                    addItem(value, RESOLVED_KEY, feature, self.__table)
                 else:
-                    self.__resolve(val)
-
-        if type(value) == list:
-            for val in value:
-                self.__resolve(val)
\ No newline at end of file
+                    value[RESOLVED_KEY] = feature
+                resolved += 1
+            else:
+                logging.debug('Unable to resolve %s' % href)
+                unresolved += 1
+        self.resolved += resolved
+        self.unresolved += unresolved
+        logging.info('Resolved %d xlink:href references, unable to resolve %d' % (resolved, unresolved))
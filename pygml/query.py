@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+from collections.abc import Mapping
+import functools
+import re
+
+from .pygml import GmlException, RESOLVED_KEY
+
+
+TOKEN = re.compile(r'''\s*(?:
+    (?P<number>-?\d+(?:\.\d+)?)(?![\w:])
+  | (?P<string>'[^']*'|"[^"]*")
+  | (?P<op>//|/|\[|\]|\(|\)|!=|<=|>=|=|<|>|~)
+  | (?P<name>@?[A-Za-z_][\w.\-]*(?::[A-Za-z_][\w.\-]*)?|@?\*|\.|\#text)
+)''', re.VERBOSE)
+
+COMPARISONS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '~': lambda a, b: b.lower() in a.lower(),
+}
+
+
+class QueryError(GmlException):
+    """Raised for queries which can't be compiled."""
+
+
+def getText(node):
+    """Return the text of an element or attribute value, or None."""
+    if type(node) is str:
+        return node
+    if isinstance(node, Mapping):
+        text = node.get('#text')
+        if type(text) is str:
+            return text
+    return None
+
+
+def iterChildren(node):
+    # values of child elements and attributes, lists are flattened and
+    # resolved references are not followed, so walks always end
+    if isinstance(node, Mapping):
+        for key, value in node.items():
+            if key != RESOLVED_KEY:
+                yield key, value
+
+
+def flatten(value, result):
+    if type(value) is list:
+        result.extend(value)
+    elif value is not None:
+        result.append(value)
+
+
+def iterDescendants(node):
+    """Yield node and all elements below it."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Mapping):
+            yield node
+            for key, value in iterChildren(node):
+                if type(value) is list:
+                    stack.extend(reversed(value))
+                elif isinstance(value, Mapping):
+                    stack.append(value)
+
+
+class Step():
+
+    def __init__(self, descendant, name, predicates):
+        self.descendant = descendant
+        self.name = name
+        self.predicates = predicates
+
+    def select(self, nodes, root):
+        if self.descendant:
+            nodes = [descendant for node in nodes for descendant in iterDescendants(node)]
+        name = self.name
+        result = []
+        for node in nodes:
+            if name == '.':
+                result.append(node)
+            elif name == '*':
+                for key, value in iterChildren(node):
+                    if key[0] not in '@#':
+                        flatten(value, result)
+            elif name == '@*':
+                for key, value in iterChildren(node):
+                    if key[0] == '@':
+                        flatten(value, result)
+            elif isinstance(node, Mapping):
+                flatten(node.get(name), result)
+        for predicate in self.predicates:
+            result = [node for node in result if predicate(node, root)]
+        return result
+
+
+class Path():
+
+    def __init__(self, absolute, steps):
+        self.absolute = absolute
+        self.steps = steps
+
+    def select(self, node, root):
+        nodes = [root if self.absolute else node]
+        for step in self.steps:
+            nodes = step.select(nodes, root)
+            if not nodes:
+                break
+        return nodes
+
+
+class Query():
+    """A compiled query, see compileQuery()."""
+
+    def __init__(self, text, path):
+        self.text = text
+        self.path = path
+
+    def __repr__(self):
+        return 'Query(%r)' % self.text
+
+    def select(self, feature):
+        """Return the values selected by the query in feature."""
+        return self.path.select(feature, feature)
+
+    def matches(self, feature):
+        return bool(self.select(feature))
+
+
+class Parser():
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                raise QueryError('Unexpected %r at %d in query %r' % (text[position:position + 10], position, self.text))
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self.position = 0
+
+    def peek(self, value=None):
+        if self.position < len(self.tokens):
+            token = self.tokens[self.position]
+            if value is None or token[1] == value:
+                return token
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise QueryError('Unexpected end of query %r' % self.text)
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        kind, token = self.next()
+        if token != value:
+            raise QueryError('Expected %r instead of %r in query %r' % (value, token, self.text))
+
+    def parse(self):
+        path = self.parsePath()
+        if self.peek() is not None:
+            raise QueryError('Unexpected %r in query %r' % (self.peek()[1], self.text))
+        return path
+
+    def parsePath(self):
+        # a leading / or // starts at the feature, otherwise at the current element
+        absolute = descendant = False
+        if self.peek('/') or self.peek('//'):
+            absolute = True
+            descendant = self.next()[1] == '//'
+        steps = [self.parseStep(descendant)]
+        while self.peek('/') or self.peek('//'):
+            steps.append(self.parseStep(self.next()[1] == '//'))
+        return Path(absolute, steps)
+
+    def parseStep(self, descendant):
+        kind, name = self.next()
+        if kind != 'name':
+            raise QueryError('Expected a name instead of %r in query %r' % (name, self.text))
+        predicates = []
+        while self.peek('['):
+            self.next()
+            predicates.append(self.parseOr())
+            self.expect(']')
+        return Step(descendant, name, predicates)
+
+    def parseOr(self):
+        operands = [self.parseAnd()]
+        while self.peek('or'):
+            self.next()
+            operands.append(self.parseAnd())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda node, root: any(operand(node, root) for operand in operands)
+
+    def parseAnd(self):
+        operands = [self.parseUnary()]
+        while self.peek('and'):
+            self.next()
+            operands.append(self.parseUnary())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda node, root: all(operand(node, root) for operand in operands)
+
+    def parseUnary(self):
+        if self.peek('not'):
+            self.next()
+            operand = self.parseUnary()
+            return lambda node, root: not operand(node, root)
+        if self.peek('('):
+            self.next()
+            expression = self.parseOr()
+            self.expect(')')
+            return expression
+        if self.peek('resolved') and self.tokens[self.position + 1:self.position + 2] == [('op', '(')]:
+            self.next()
+            self.expect('(')
+            self.expect(')')
+            return lambda node, root: isinstance(node, Mapping) and RESOLVED_KEY in node
+        return self.parseComparison()
+
+    def parseComparison(self):
+        path = self.parsePath()
+        token = self.peek()
+        if token is None or token[1] not in COMPARISONS:
+            return lambda node, root: bool(path.select(node, root))
+        operator = self.next()[1]
+        compare = COMPARISONS[operator]
+        kind, literal = self.next()
+        if kind == 'number':
+            if operator == '~':
+                raise QueryError('Expected a string after ~ instead of %r in query %r' % (literal, self.text))
+            number = float(literal)
+
+            def predicate(node, root):
+                for value in path.select(node, root):
+                    try:
+                        if compare(float(getText(value)), number):
+                            return True
+                    except (TypeError, ValueError):
+                        pass
+                return False
+            return predicate
+        if kind != 'string':
+            raise QueryError('Expected a number or string instead of %r in query %r' % (literal, self.text))
+        literal = literal[1:-1]
+
+        def predicate(node, root):
+            for value in path.select(node, root):
+                text = getText(value)
+                if text is not None and compare(text, literal):
+                    return True
+            return False
+        return predicate
+
+
+@functools.lru_cache(maxsize=128)
+def compileQuery(text):
+    """Compile a query, raise QueryError if it is invalid.
+
+    Queries are paths over a feature as returned by Dataset.getFeature(),
+    e.g. /cp:CadastralParcel[cp:areaValue > 1000 and .//*[@xlink:href and not resolved()]]
+
+    - steps are separated by /, // selects elements at any depth below
+    - names are element or attribute keys (ns:name, @name), * is any element,
+      @* any attribute, . the current element, #text the text of an element
+      which has attributes
+    - predicates in [] are paths, true if they select anything, or comparisons
+      of path values with =, !=, <, <=, >, >= or ~ (contains, ignoring case),
+      combined by and, or, not and parentheses; numbers compare as numbers
+    - resolved() is true for elements whose xlink:href was resolved
+
+    A feature matches a query if the query selects anything in it. Resolved
+    references are not followed.
+    """
+    return Query(text, Parser(text).parse())
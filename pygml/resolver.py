@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+import logging
+import os
+import threading
+
+from .xmltodict import xmltodict
+from .cache import DatasetCache
+from .index import loadMembers, reportProgress
+from .pygml import Dataset, GmlException
+
+
+def isFileId(id):
+    """False for hrefs which can't be the gml:id of a feature in a file,
+    e.g. URNs and URLs, gml:ids have no ':' or '/'."""
+    return bool(id) and ':' not in id and '/' not in id
+
+
+class Resolver():
+    """Resolves xlink:href references into other GML files.
+
+    'file.gml#id' is resolved against file.gml next to the referencing file,
+    bare ids against the combined id indexes of all registered files.
+    Datasets are opened lazily, once, and kept in datasets (a DatasetCache)
+    so every layer referencing the same file shares them. options are passed
+    to Dataset, by default lazy parsing with lazy references.
+
+    The combined id index is extended by the files registered since, either
+    on demand or, with background=True, only by indexIds(), e.g. called by a
+    background task, so that resolving never scans files. Ids are not found
+    in files which aren't indexed yet then.
+    """
+
+    def __init__(self, datasets=None, background=False, **options):
+        self.datasets = datasets if datasets is not None else DatasetCache()
+        self.background = background
+        self.options = options or {'lazy': True, 'lazy_xlink_href': True}
+        self.paths = []
+        self.__ids = {}
+        self.__indexed = 0
+        self.__lock = threading.Lock()
+        self.__failed = set()
+
+    def register(self, path):
+        path = os.path.abspath(path)
+        if path not in self.paths:
+            self.paths.append(path)
+
+    def registerFolder(self, folder, extensions=('.gml', '.xml')):
+        """Register all GML files of folder."""
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(extensions):
+                self.register(os.path.join(folder, name))
+
+    def getDataset(self, path):
+        """Return the Dataset of path, opening it on first use, or None."""
+        path = os.path.abspath(path)
+        dataset = self.datasets.get(path)
+        if dataset is None and path not in self.__failed:
+            try:
+                dataset = Dataset(path, resolver=self, **self.options)
+            except (GmlException, xmltodict.expat.ExpatError, OSError) as e:
+                logging.warning('Unable to open %s: %s' % (path, e))
+                self.__failed.add(path)
+                return None
+            self.datasets.put(path, dataset)
+        return dataset
+
+    def isIndexed(self):
+        return self.__indexed == len(self.paths)
+
+    def indexIds(self, progress=None):
+        """Add the ids of the files registered since the last call to the
+        combined id index, the first registered file wins.
+
+        The member indexes are saved as sidecars, so the datasets of the
+        files open without scanning them again. progress(done, total) is
+        called with the number of files indexed so far, indexing is
+        cancelled with LoadCancelled if it returns False.
+        """
+        with self.__lock:
+            paths = self.paths[self.__indexed:]
+            if not paths:
+                return
+            ids = dict(self.__ids)
+            for i, path in enumerate(paths, 1):
+                try:
+                    members = loadMembers(path)
+                except (xmltodict.expat.ExpatError, OSError, ValueError) as e:
+                    logging.warning('Unable to index %s: %s' % (path, e))
+                else:
+                    for member_id in members.ids:
+                        ids.setdefault(member_id, path)
+                reportProgress(progress, i, len(paths))
+            # replaced at once, lookups may run in another thread
+            self.__ids = ids
+            self.__indexed += len(paths)
+            logging.info('Indexed %d ids in %d files' % (len(ids), self.__indexed))
+
+    def findPath(self, id):
+        """Return the registered file containing a feature with this id, or None."""
+        if not (self.background or self.isIndexed()):
+            self.indexIds()
+        return self.__ids.get(id)
+
+    def getTarget(self, href, base):
+        """Return the dataset containing the feature href refers to, or None.
+
+        base is the path of the referencing file.
+        """
+        path, sep, id = href.rpartition('#')
+        if path:
+            if '://' in path:
+                return None
+            path = os.path.join(os.path.dirname(os.path.abspath(base)), path)
+            if not os.path.isfile(path):
+                return None
+        else:
+            if not isFileId(id):
+                return None
+            path = self.findPath(id)
+            if path is None or path == os.path.abspath(base):
+                return None
+        dataset = self.getDataset(path)
+        if dataset is None or not dataset.hasFeature(id):
+            return None
+        return dataset
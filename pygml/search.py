@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+import re
+
+from .pygml import RESOLVED_KEY
+
+
+WORD = re.compile(r'\w+')
+
+
+def iterWords(feature):
+    """Yield the lowercased words of the element names and values of a feature.
+
+    Resolved references are skipped, their words belong to the referenced feature.
+    """
+    stack = [feature]
+    while stack:
+        value = stack.pop()
+        if type(value) is str:
+            yield from WORD.findall(value.lower())
+        elif isinstance(value, Mapping):
+            for key, child in value.items():
+                if key != RESOLVED_KEY:
+                    yield from WORD.findall(key.lower())
+                    stack.append(child)
+        elif type(value) is list:
+            stack.extend(value)
+
+
+class InvertedIndex():
+    """Maps the words of all members of a dataset to their positions.
+
+    postings holds an ascending array of member positions for every word,
+    ids the first @gml:id/@fid of every member (None if it has none).
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.ids = []
+        self.__words = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, id, feature):
+        return self.addWords(id, set(iterWords(feature)))
+
+    def addWords(self, id, words):
+        """Add a member by its id and its distinct words."""
+        position = len(self.ids)
+        self.ids.append(id)
+        postings = self.postings
+        for word in words:
+            positions = postings.get(word)
+            if positions is None:
+                postings[word] = positions = array('l')
+            positions.append(position)
+        self.__words = None
+        return position
+
+    def estimateSize(self):
+        """Estimate the memory used by the index in bytes."""
+        return sum(100 + positions.itemsize * len(positions) for positions in self.postings.values()) + 50 * len(self.ids)
+
+    def getPositions(self, word, prefix=False):
+        """Return the positions of members containing word, or a word starting with it."""
+        if not prefix:
+            return set(self.postings.get(word, ()))
+        if self.__words is None:
+            self.__words = sorted(self.postings)
+        words = self.__words
+        positions = set()
+        for i in range(bisect_left(words, word), len(words)):
+            if not words[i].startswith(word):
+                break
+            positions.update(self.postings[words[i]])
+        return positions
+
+    def search(self, text):
+        """Return the ascending positions of the members containing all words of text.
+
+        The last word also matches longer words, e.g. 'zone 1' matches 'Zone 12'.
+        """
+        words = WORD.findall(text.lower())
+        if not words:
+            return []
+        last = words.pop()
+        # intersect starting with the rarest word
+        candidates = sorted((self.getPositions(word) for word in set(words)), key=len)
+        candidates.append(self.getPositions(last, prefix=True))
+        result = candidates[0]
+        for positions in candidates[1:]:
+            if not result:
+                break
+            result &= positions
+        return sorted(result)
+
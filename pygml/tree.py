@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""
+pygml for parsing GML files (ISO19136)
+"""
+
+__title__ = 'pygml'
+__author__ = 'Jürgen Weichand'
+__version__ = '0.3.1'
+__license__ = 'Apache 2.0'
+__copyright__ = 'Copyright 2015 Jürgen Weichand'
+
+
+from array import array
+from collections.abc import Mapping, Sequence
+
+from .pygml import RESOLVED_KEY, Reference, getIds
+
+
+# kinds of tree nodes
+NODE = 0
+LEAF = 1
+REFERENCE = 2
+BACK_REFERENCE = 3
+MESSAGE = 4
+
+# keys of sources which are no keys of the value, compared by identity,
+# unlike the kinds they can't be mistaken for the positions of list items
+MESSAGE_KEY = object()
+BACK_REFERENCE_KEY = object()
+DEPTH_LIMIT_KEY = object()
+
+
+class ListSources(Sequence):
+    """(index, value) pairs of a list, without copying it.
+
+    Labels are taken from the position, not from list.index(), which compares
+    elements and finds the first of several equal ones.
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, row):
+        return row, self.values[row]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class TreeNode():
+    """Node of a FeatureTree, its children are created on demand.
+
+    sources holds what the children are built from: (key, value) pairs of a
+    dict, (index, value) pairs of a list or a single (None, value) pair.
+    position is the position of the node in the SearchIndex of its tree.
+    """
+    __slots__ = ('tree', 'parent', 'row', 'text', 'kind', 'value', 'sources', 'children', 'position')
+
+    def __init__(self, tree, parent, row, text, kind=NODE, value=None):
+        self.tree = tree
+        self.parent = parent
+        self.row = row
+        self.text = text
+        self.kind = kind
+        self.value = value
+        self.sources = None
+        self.children = []
+        self.position = None
+
+    def getSources(self):
+        if self.sources is None:
+            self.sources = self.tree.getSources(self)
+        return self.sources
+
+    def hasChildren(self):
+        if self.kind == REFERENCE:
+            # not resolved just to draw the expand indicator
+            return True
+        return self.kind == NODE and bool(self.getSources())
+
+    def canFetchMore(self):
+        return self.kind in (NODE, REFERENCE) and len(self.children) < len(self.getSources())
+
+    def fetchMore(self, count):
+        """Create up to count more children, return the new ones."""
+        sources = self.getSources()
+        start = len(self.children)
+        for row in range(start, min(start + count, len(sources))):
+            key, value = sources[row]
+            self.children.append(self.tree.createNode(self, row, key, value))
+        return self.children[start:]
+
+    def fetchAll(self):
+        while self.canFetchMore():
+            self.fetchMore(len(self.getSources()))
+        return self.children
+
+
+class FeatureTree():
+    """Tree of labels for a dict of features, as produced by pygml.Dataset.
+
+    References ('@xlink:href [resolved]') are resolved when their node is
+    expanded. Every feature is shown once per tree, further references to it
+    become '↻ already shown' nodes, so cyclic references end there. With
+    max_depth, references nested deeper than max_depth references are
+    not expanded.
+    """
+
+    def __init__(self, value, shown=(), max_depth=None):
+        self.shown = set(shown)
+        self.max_depth = max_depth
+        self.root = TreeNode(self, None, 0, '', NODE, value)
+        # number of nodes created so far, tells whether index is outdated
+        self.size = 0
+        self.index = None
+
+    @classmethod
+    def fromMessage(cls, text):
+        tree = cls(None)
+        tree.root.sources = [(MESSAGE_KEY, text)]
+        return tree
+
+    def getSources(self, node):
+        value = node.value
+        if node.kind == REFERENCE:
+            ids = [value.id] if type(value) is Reference else getIds(value)
+            if self.shown.intersection(ids):
+                return [(BACK_REFERENCE_KEY, ids)]
+            if self.max_depth is not None and self.getDepth(node) > self.max_depth:
+                return [(DEPTH_LIMIT_KEY, self.max_depth)]
+            self.shown.update(ids)
+            if type(value) is Reference:
+                value = value.resolve() or {}
+        if isinstance(value, Mapping):
+            return [(key, val) for key, val in sorted(value.items())
+                    if not (type(val) is str and '@xmlns' in key)]
+        if type(value) is list:
+            return ListSources(value)
+        return [(None, value)]
+
+    def getDepth(self, node):
+        """Return the number of references from the top level to node, itself included."""
+        depth = 0
+        while node is not None:
+            if node.kind == REFERENCE:
+                depth += 1
+            node = node.parent
+        return depth
+
+    def createNode(self, parent, row, key, value):
+        self.size += 1
+        if key is MESSAGE_KEY:
+            return TreeNode(self, parent, row, value, MESSAGE)
+        if key is BACK_REFERENCE_KEY:
+            return TreeNode(self, parent, row, u'↻ already shown: ' + ', '.join(value), BACK_REFERENCE)
+        if key is DEPTH_LIMIT_KEY:
+            return TreeNode(self, parent, row, u'\u2026 more than %d references deep' % value, MESSAGE)
+        if key is None:
+            return TreeNode(self, parent, row, str(value), LEAF)
+        if type(key) is int:
+            if isinstance(value, (Mapping, list)):
+                return TreeNode(self, parent, row, '[' + str(key) + ']', NODE, value)
+            return TreeNode(self, parent, row, str(value), LEAF)
+        if key == RESOLVED_KEY:
+            return TreeNode(self, parent, row, key, REFERENCE, value)
+        if type(value) is str:
+            return TreeNode(self, parent, row, key + " '" + value + "'", LEAF)
+        return TreeNode(self, parent, row, key, NODE, value)
+
+    def isIndexed(self):
+        return self.index is not None and self.index.size == self.size
+
+    def getIndex(self):
+        """Return the SearchIndex of the tree, creating all nodes except those of
+        unexpanded references if it has to be built."""
+        if not self.isIndexed():
+            self.index = SearchIndex(self)
+        return self.index
+
+    def match(self, query):
+        return self.getIndex().match(query)
+
+
+class SearchIndex():
+    """Flattened labels of a FeatureTree for searching it.
+
+    Nodes are stored in pre-order, so parents come before their children:
+    labels holds the lowercased texts, parents the position of the parent of
+    every node (-1 for the top level).
+    """
+
+    def __init__(self, feature_tree):
+        self.nodes = []
+        self.labels = []
+        self.parents = array('l')
+        stack = [(child, -1) for child in reversed(feature_tree.root.fetchAll())]
+        while stack:
+            node, parent = stack.pop()
+            node.position = len(self.nodes)
+            self.nodes.append(node)
+            self.labels.append(node.text.lower())
+            self.parents.append(parent)
+            if node.kind == NODE:
+                node.fetchAll()
+            # references are only searched where they were already expanded
+            stack.extend((child, node.position) for child in reversed(node.children))
+        self.size = feature_tree.size
+
+    def getPath(self, position):
+        parts = []
+        while position >= 0:
+            parts.append(self.labels[position])
+            position = self.parents[position]
+        return ' > '.join(parts)
+
+    def match(self, query):
+        """Return the visibility mask for query, one byte per position.
+
+        A node is visible if its path, its label and those of its ancestors,
+        contains query (case-insensitive) or if one of its descendants is visible.
+        """
+        query = query.lower()
+        labels = self.labels
+        parents = self.parents
+        visible = bytearray(len(labels))
+        if ' > ' in query:
+            # spans several labels, compare whole paths
+            for position in range(len(labels)):
+                visible[position] = query in self.getPath(position)
+        else:
+            for position, label in enumerate(labels):
+                parent = parents[position]
+                visible[position] = query in label or (parent >= 0 and visible[parent])
+        for position in range(len(labels) - 1, -1, -1):
+            parent = parents[position]
+            if visible[position] and parent >= 0:
+                visible[parent] = 1
+        return visible
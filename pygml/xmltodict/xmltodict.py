@@ -16,6 +16,7 @@ except ImportError:  # pragma no cover
         from io import StringIO
 
 from collections import OrderedDict
+from sys import intern
 
 try:  # pragma no cover
     _basestring = basestring
@@ -49,7 +50,8 @@ class _DictSAXHandler(object):
                  strip_whitespace=True,
                  namespace_separator=':',
                  namespaces=None,
-                 force_list=None):
+                 force_list=None,
+                 memoize_postprocessor=None):
         self.path = []
         self.stack = []
         self.data = []
@@ -68,6 +70,80 @@ class _DictSAXHandler(object):
         self.namespaces = namespaces
         self.namespace_declarations = OrderedDict()
         self.force_list = force_list
+        # per-parse caches of raw expat names to built, interned element
+        # names and prefixed attribute keys, so that all elements with the
+        # same name share one key object
+        self._names = {}
+        self._attr_names = {}
+        # postprocessors whose result only depends on the key (and which
+        # return the value unchanged) are called once per distinct key
+        if memoize_postprocessor is None:
+            memoize_postprocessor = getattr(postprocessor, 'key_only', False)
+        self._processed = {} if postprocessor and memoize_postprocessor else None
+        # set by create_parser(), elements whose key such a postprocessor
+        # drops are skipped with their content by swapping its handlers,
+        # _dropped holds their raw names
+        self.parser = None
+        self._dropped = set()
+        self._skip_depth = 0
+
+    def _get_name(self, full_name):
+        try:
+            return self._names[full_name]
+        except KeyError:
+            name = self._names[full_name] = intern(self._build_name(full_name))
+            if self._processed is not None and self._postprocess(name, None) is None:
+                self._dropped.add(full_name)
+            return name
+
+    def _get_attr_name(self, key):
+        try:
+            return self._attr_names[key]
+        except KeyError:
+            name = self._attr_names[key] = intern(self.attr_prefix + self._build_name(key))
+            return name
+
+    def _postprocess(self, key, value):
+        processed = self._processed
+        if processed is None:
+            return self.postprocessor(self.path, key, value)
+        try:
+            new_key = processed[key]
+        except KeyError:
+            result = self.postprocessor(self.path, key, value)
+            new_key = processed[key] = intern(result[0]) if result else None
+        if new_key is None:
+            return None
+        return new_key, value
+
+    def _skip(self, name):
+        # push the element without attributes, descendants and character
+        # data are ignored by expat until it is closed
+        if self.namespace_declarations:
+            self.namespace_declarations = OrderedDict()
+        self.path.append((name, None))
+        self.stack.append((self.item, self.data))
+        self.item = None
+        self.data = []
+        self._skip_depth = 1
+        parser = self.parser
+        parser.StartNamespaceDeclHandler = None
+        parser.StartElementHandler = self._skip_start
+        parser.EndElementHandler = self._skip_end
+        parser.CharacterDataHandler = None
+
+    def _skip_start(self, full_name, attrs):
+        self._skip_depth += 1
+
+    def _skip_end(self, full_name):
+        self._skip_depth -= 1
+        if not self._skip_depth:
+            parser = self.parser
+            parser.StartNamespaceDeclHandler = self.startNamespaceDecl
+            parser.StartElementHandler = self.startElement
+            parser.EndElementHandler = self.endElement
+            parser.CharacterDataHandler = self.characters
+            self.endElement(full_name)
 
     def _build_name(self, full_name):
         if not self.namespaces:
@@ -91,7 +167,11 @@ class _DictSAXHandler(object):
         self.namespace_declarations[prefix or ''] = uri
 
     def startElement(self, full_name, attrs):
-        name = self._build_name(full_name)
+        name = self._get_name(full_name)
+        if full_name in self._dropped and self.parser is not None \
+                and len(self.path) >= self.item_depth:
+            self._skip(name)
+            return
         attrs = self._attrs_to_dict(attrs)
         if attrs and self.namespace_declarations:
             attrs['xmlns'] = self.namespace_declarations
@@ -102,9 +182,9 @@ class _DictSAXHandler(object):
             if self.xml_attribs:
                 attr_entries = []
                 for key, value in attrs.items():
-                    key = self.attr_prefix+self._build_name(key)
+                    key = self._get_attr_name(key)
                     if self.postprocessor:
-                        entry = self.postprocessor(self.path, key, value)
+                        entry = self._postprocess(key, value)
                     else:
                         entry = (key, value)
                     if entry:
@@ -116,7 +196,7 @@ class _DictSAXHandler(object):
             self.data = []
 
     def endElement(self, full_name):
-        name = self._build_name(full_name)
+        name = self._get_name(full_name)
         if len(self.path) == self.item_depth:
             item = self.item
             if item is None:
@@ -154,7 +234,7 @@ class _DictSAXHandler(object):
 
     def push_data(self, item, key, data):
         if self.postprocessor is not None:
-            result = self.postprocessor(self.path, key, data)
+            result = self._postprocess(key, data)
             if result is None:
                 return item
             key, data = result
@@ -184,6 +264,45 @@ class _DictSAXHandler(object):
             return self.force_list(self.path[:-1], key, value)
 
 
+def create_parser(handler, encoding=None, expat=expat,
+                  process_namespaces=False, namespace_separator=':',
+                  disable_entities=True):
+    """Create an expat parser which reports its events to `handler`.
+
+    This allows incremental parsing with `parser.Parse(data, False)`, e.g.
+    to consume the items of a streaming handler between two blocks.
+    """
+    if not process_namespaces:
+        namespace_separator = None
+    parser = expat.ParserCreate(
+        encoding,
+        namespace_separator
+    )
+    try:
+        parser.ordered_attributes = True
+    except AttributeError:
+        # Jython's expat does not support ordered_attributes
+        pass
+    parser.StartNamespaceDeclHandler = handler.startNamespaceDecl
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    parser.CharacterDataHandler = handler.characters
+    parser.buffer_text = True
+    handler.parser = parser
+    if disable_entities:
+        try:
+            # Attempt to disable DTD in Jython's expat parser (Xerces-J).
+            feature = "http://apache.org/xml/features/disallow-doctype-decl"
+            parser._reader.setFeature(feature, True)
+        except AttributeError:
+            # For CPython / expat parser.
+            # Anything not handled ends up here and entities aren't expanded.
+            parser.DefaultHandler = lambda x: None
+            # Expects an integer return; zero means failure -> expat.ExpatError.
+            parser.ExternalEntityRefHandler = lambda *x: 1
+    return parser
+
+
 def parse(xml_input, encoding=None, expat=expat, process_namespaces=False,
           namespace_separator=':', disable_entities=True, **kwargs):
     """Parse the given XML input and convert it into a dictionary.
@@ -294,33 +413,8 @@ def parse(xml_input, encoding=None, expat=expat, process_namespaces=False,
         if not encoding:
             encoding = 'utf-8'
         xml_input = xml_input.encode(encoding)
-    if not process_namespaces:
-        namespace_separator = None
-    parser = expat.ParserCreate(
-        encoding,
-        namespace_separator
-    )
-    try:
-        parser.ordered_attributes = True
-    except AttributeError:
-        # Jython's expat does not support ordered_attributes
-        pass
-    parser.StartNamespaceDeclHandler = handler.startNamespaceDecl
-    parser.StartElementHandler = handler.startElement
-    parser.EndElementHandler = handler.endElement
-    parser.CharacterDataHandler = handler.characters
-    parser.buffer_text = True
-    if disable_entities:
-        try:
-            # Attempt to disable DTD in Jython's expat parser (Xerces-J).
-            feature = "http://apache.org/xml/features/disallow-doctype-decl"
-            parser._reader.setFeature(feature, True)
-        except AttributeError:
-            # For CPython / expat parser.
-            # Anything not handled ends up here and entities aren't expanded.
-            parser.DefaultHandler = lambda x: None
-            # Expects an integer return; zero means failure -> expat.ExpatError.
-            parser.ExternalEntityRefHandler = lambda *x: 1
+    parser = create_parser(handler, encoding, expat, process_namespaces,
+                           namespace_separator, disable_entities)
     if hasattr(xml_input, 'read'):
         parser.ParseFile(xml_input)
     else:
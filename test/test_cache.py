@@ -0,0 +1,63 @@
+# coding=utf-8
+"""pygml DatasetCache tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+from pygml import cache
+
+
+class FakeDataset():
+
+    def __init__(self, size):
+        self.size = size
+
+    def estimateSize(self):
+        return self.size
+
+
+class DatasetCacheTest(unittest.TestCase):
+    """Test the LRU dataset cache."""
+
+    def test_max_entries(self):
+        """The least recently used dataset is evicted first."""
+        datasets = cache.DatasetCache(max_entries=2)
+        datasets.put('a.gml', FakeDataset(1))
+        datasets.put('b.gml', FakeDataset(1))
+        self.assertIsNotNone(datasets.get('a.gml'))
+        datasets.put('c.gml', FakeDataset(1))
+        self.assertEqual(datasets.keys(), ['a.gml', 'c.gml'])
+        self.assertIsNone(datasets.get('b.gml'))
+        self.assertEqual((datasets.hits, datasets.misses, datasets.evictions), (1, 1, 1))
+
+    def test_max_bytes(self):
+        """Datasets are evicted until the size budget is met."""
+        datasets = cache.DatasetCache(max_bytes=100)
+        datasets.put('a.gml', FakeDataset(60))
+        datasets.put('b.gml', FakeDataset(30))
+        datasets.put('c.gml', FakeDataset(30))
+        self.assertEqual(datasets.keys(), ['b.gml', 'c.gml'])
+        # the most recent dataset is kept even if it is too large
+        datasets.put('d.gml', FakeDataset(200))
+        self.assertEqual(datasets.keys(), ['d.gml'])
+
+    def test_remove(self):
+        """Removed datasets count as evictions."""
+        datasets = cache.DatasetCache()
+        datasets.put('a.gml', FakeDataset(1))
+        datasets.remove('a.gml')
+        datasets.remove('a.gml')
+        self.assertNotIn('a.gml', datasets)
+        self.assertEqual(datasets.evictions, 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DatasetCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
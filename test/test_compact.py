@@ -0,0 +1,97 @@
+# coding=utf-8
+"""pygml compact feature tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+import unittest
+
+from pygml import compact, pygml, tree
+from test_pygml import GML_32
+from test_tree import CYCLE
+
+
+class CompactTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content):
+        filename = os.path.join(self.tmpdir, 'test.gml')
+        with open(filename, 'wb') as f:
+            f.write(content)
+        return filename
+
+    def test_mapping(self):
+        feature = OrderedDict([('ex:Road', OrderedDict([('@gml:id', 'R.1'), ('ex:lanes', ['1', '2']), ('ex:name', None)]))])
+        node = compact.compactFeature(feature)
+        self.assertEqual(node, feature)
+        self.assertEqual(list(node['ex:Road']), ['@gml:id', 'ex:lanes', 'ex:name'])
+        self.assertEqual(node['ex:Road']['ex:lanes'], ['1', '2'])
+        self.assertIn('ex:name', node['ex:Road'])
+        self.assertIsNone(node['ex:Road'].get('ex:name', 'missing'))
+        self.assertRaises(KeyError, node.__getitem__, 'ex:Rail')
+        with self.assertRaises(TypeError):
+            node['ex:Rail'] = {}
+        self.assertEqual(pygml.getIds(node), ['R.1'])
+
+    def test_sharing(self):
+        table = compact.StringTable()
+        first, second = [compact.compactFeature(OrderedDict([('ex:name', ''.join(['Main', ' Street']))]), table)
+                         for i in range(2)]
+        self.assertIs(first['ex:name'], second['ex:name'])
+        self.assertIs(first._keys, second._keys)
+
+    def test_dataset(self):
+        filename = self.write(GML_32)
+        expected = pygml.Dataset(filename, persistent_index=False)
+        gml = pygml.Dataset(filename, persistent_index=False, compact=True)
+        self.assertEqual(gml.getFeatures(), expected.getFeatures())
+        self.assertIsInstance(gml.getFeature('CP.1'), compact.CompactNode)
+        self.assertLess(gml.estimateSize(), expected.estimateSize())
+        self.assertEqual(gml.queryFeatures('/*[cp:areaValue > 1000]').__next__(), gml.getFeature('CP.1'))
+
+    def test_cycle(self):
+        gml = pygml.Dataset(self.write(CYCLE), persistent_index=False, compact=True)
+        building, address = gml.getFeature('B.1'), gml.getFeature('A.1')
+        self.assertIs(building['ex:Building']['ex:address']['@xlink:href [resolved]'], address)
+        self.assertIs(address['ex:Address']['ex:building']['@xlink:href [resolved]'], building)
+        feature_tree = tree.FeatureTree(OrderedDict([('Selected feature [1]', building)]), ['B.1'])
+        texts = [node.text for node in feature_tree.root.fetchAll()[0].fetchAll()[0].fetchAll()]
+        self.assertEqual(texts, ["@gml:id 'B.1'", 'ex:address', "ex:name 'Town hall'"])
+
+    def test_modes(self):
+        filename = self.write(CYCLE)
+        expected = pygml.Dataset(filename, persistent_index=False)
+        for options in ({'lazy': True}, {'lazy': True, 'lazy_xlink_href': True}, {'workers': 2}):
+            gml = pygml.Dataset(filename, persistent_index=False, compact=True, **options)
+            building = gml.getFeature('B.1')
+            self.assertIsInstance(building, compact.CompactNode)
+            address = building['ex:Building']['ex:address']['@xlink:href [resolved]']
+            self.assertEqual(pygml.getIds(address), ['A.1'])
+            self.assertEqual(list(address['ex:Address']), list(expected.getFeature('A.1')['ex:Address']))
+            self.assertEqual(address['ex:Address']['ex:building']['@xlink:href [resolved]']['ex:Building']['@gml:id'],
+                             'B.1')
+
+    def test_add_item(self):
+        table = compact.StringTable()
+        node = compact.compactFeature(OrderedDict([('@xlink:href', '#R.1')]), table)
+        compact.addItem(node, '@xlink:href [resolved]', 'R.1', table)
+        self.assertEqual(list(node.items()), [('@xlink:href', '#R.1'), ('@xlink:href [resolved]', 'R.1')])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CompactTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
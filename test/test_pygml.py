@@ -0,0 +1,347 @@
+# coding=utf-8
+"""pygml Dataset tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pygml import index, pygml
+
+
+GML_32 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:gml="http://www.opengis.net/gml/3.2"
+    xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:cp="urn:x-inspire:specification:gmlas:CadastralParcels:3.0">
+  <wfs:member>
+    <cp:CadastralParcel gml:id="CP.1">
+      <cp:geometry><gml:Polygon><gml:posList>0 0 1 1 0 1 0 0</gml:posList></gml:Polygon></cp:geometry>
+      <cp:areaValue uom="m2">1200</cp:areaValue>
+      <cp:label>1/1</cp:label>
+      <cp:zoning xlink:href="#CZ.1"/>
+    </cp:CadastralParcel>
+  </wfs:member>
+  <wfs:member>
+    <cp:CadastralParcel gml:id="CP.2">
+      <cp:areaValue uom="m2">800</cp:areaValue>
+      <cp:label>1/2</cp:label>
+      <cp:zoning xlink:href="#CZ.404"/>
+    </cp:CadastralParcel>
+  </wfs:member>
+  <wfs:member>
+    <cp:CadastralZoning gml:id="CZ.1">
+      <cp:label>Zone 1</cp:label>
+    </cp:CadastralZoning>
+  </wfs:member>
+</wfs:FeatureCollection>
+'''
+
+GML_31 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml"
+    xmlns:ex="http://example.org">
+  <gml:featureMembers>
+    <ex:Road gml:id="R.1"><ex:name>A</ex:name></ex:Road>
+    <ex:Road gml:id="R.2"><ex:name>B</ex:name></ex:Road>
+  </gml:featureMembers>
+</gml:FeatureCollection>
+'''
+
+GML_2 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs"
+    xmlns:gml="http://www.opengis.net/gml"
+    xmlns:ex="http://example.org">
+  <gml:featureMember>
+    <ex:Building fid="B.1"><ex:the_geom><gml:Point/></ex:the_geom><ex:floors>3</ex:floors></ex:Building>
+  </gml:featureMember>
+</wfs:FeatureCollection>
+'''
+
+
+class DatasetTest(unittest.TestCase):
+    """Test pygml.Dataset on GML 3.2, 3.1 and 2.0 containers."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Runs after each test."""
+        for name in os.listdir(self.tmpdir):
+            sidecar = index.getSidecar(os.path.join(self.tmpdir, name))
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content, name='test.gml'):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'wb') as f:
+            f.write(content)
+        return filename
+
+    def test_get_feature(self):
+        """Features are found by @gml:id and geometries are dropped."""
+        gml = pygml.Dataset(self.write(GML_32))
+        feature = gml.getFeature('CP.1')
+        self.assertEqual(feature['cp:CadastralParcel']['cp:label'], '1/1')
+        self.assertNotIn('cp:geometry', feature['cp:CadastralParcel'])
+        self.assertIsNone(gml.getFeature('CP.404'))
+
+    def test_get_features_bulk(self):
+        """getFeatures(ids) answers in the order of the given ids."""
+        gml = pygml.Dataset(self.write(GML_32))
+        features = gml.getFeatures(['CZ.1', 'CP.404', 'CP.2'])
+        self.assertEqual(len(features), 3)
+        self.assertIn('cp:CadastralZoning', features[0])
+        self.assertIsNone(features[1])
+        self.assertIn('cp:CadastralParcel', features[2])
+        self.assertEqual(len(gml.getFeatures()), 3)
+
+    def test_resolve_xlink_href(self):
+        """Local xlink:href references are resolved."""
+        gml = pygml.Dataset(self.write(GML_32))
+        zoning = gml.getFeature('CP.1')['cp:CadastralParcel']['cp:zoning']
+        self.assertIs(zoning['@xlink:href [resolved]'], gml.getFeature('CZ.1'))
+        zoning = gml.getFeature('CP.2')['cp:CadastralParcel']['cp:zoning']
+        self.assertNotIn('@xlink:href [resolved]', zoning)
+        self.assertEqual((gml.resolved, gml.unresolved), (1, 1))
+
+    def test_lazy_xlink_href(self):
+        """References are only looked up when they are accessed."""
+        for lazy in (False, True):
+            gml = pygml.Dataset(self.write(GML_32), lazy=lazy, lazy_xlink_href=True)
+            zoning = gml.getFeature('CP.1')['cp:CadastralParcel']['cp:zoning']
+            reference = zoning['@xlink:href [resolved]']
+            self.assertIsInstance(reference, pygml.Reference)
+            self.assertEqual(reference['cp:CadastralZoning']['cp:label'], 'Zone 1')
+            self.assertEqual(dict(reference), dict(gml.getFeature('CZ.1')))
+            zoning = gml.getFeature('CP.2')['cp:CadastralParcel']['cp:zoning']
+            self.assertNotIn('@xlink:href [resolved]', zoning)
+
+    def test_feature_members(self):
+        """GML 3.1 featureMembers are split into single features."""
+        gml = pygml.Dataset(self.write(GML_31))
+        self.assertEqual(len(gml.getFeatures()), 2)
+        self.assertEqual(gml.getFeature('R.2')['ex:Road']['ex:name'], 'B')
+
+    def test_feature_member(self):
+        """GML 2.0 featureMember is indexed by @fid."""
+        gml = pygml.Dataset(self.write(GML_2))
+        feature = gml.getFeature('B.1')
+        self.assertEqual(feature['ex:Building']['ex:floors'], '3')
+        self.assertNotIn('ex:the_geom', feature['ex:Building'])
+
+    def test_streaming(self):
+        """Streaming mode yields the same members without keeping them."""
+        filename = self.write(GML_32)
+        gml = pygml.Dataset(filename, streaming=True)
+        features = list(gml.iterFeatures())
+        self.assertEqual(features, list(pygml.Dataset(filename, resolve_xlink_href=False).getFeatures()))
+        self.assertEqual(gml.getFeature('CZ.1')['cp:CadastralZoning']['cp:label'], 'Zone 1')
+        features = gml.getFeatures(['CP.2', 'CP.404'])
+        self.assertEqual(features[0]['cp:CadastralParcel']['cp:label'], '1/2')
+        self.assertIsNone(features[1])
+
+    def test_iter_features_small_blocks(self):
+        """Members split across read blocks are assembled correctly."""
+        filename = self.write(GML_31)
+        features = list(pygml.iterFeatures(filename, blocksize=7))
+        self.assertEqual([list(f.values())[0]['ex:name'] for f in features], ['A', 'B'])
+
+    def test_lazy(self):
+        """Lazy mode parses the requested members from their byte range."""
+        for content in (GML_32, GML_31, GML_2):
+            filename = self.write(content)
+            eager = pygml.Dataset(filename, resolve_xlink_href=False)
+            lazy = pygml.Dataset(filename, resolve_xlink_href=False, lazy=True)
+            self.assertEqual(list(lazy.iterFeatures()), eager.getFeatures())
+
+    def test_lazy_resolve_xlink_href(self):
+        """Lazy mode materialises referenced features on demand."""
+        gml = pygml.Dataset(self.write(GML_32), lazy=True)
+        zoning = gml.getFeature('CP.1')['cp:CadastralParcel']['cp:zoning']
+        self.assertIs(zoning['@xlink:href [resolved]'], gml.getFeature('CZ.1'))
+        self.assertEqual(gml.getFeatures(['CP.404', 'CP.2'])[1]['cp:CadastralParcel']['cp:label'], '1/2')
+
+    def test_scan_members(self):
+        """Member ranges cover the feature elements."""
+        filename = self.write(GML_31)
+        members = index.scanMembers(filename, blocksize=5)
+        self.assertEqual(len(members), 2)
+        start, end = members.getRange(members.getPosition('R.2'))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read()[start:end], b'<ex:Road gml:id="R.2"><ex:name>B</ex:name></ex:Road>')
+
+    def test_scan_empty_members(self):
+        """Empty member elements end after their tag, even with > in attributes."""
+        data = (b'<wfs:FeatureCollection xmlns:wfs="w" xmlns:gml="g" xmlns:ex="e">'
+                b'<wfs:member><ex:A gml:id="A.1" note="a>b"/></wfs:member>'
+                b'<wfs:member><ex:B gml:id="B.1"/><!-- b --></wfs:member></wfs:FeatureCollection>')
+        gml = pygml.Dataset(self.write(data), lazy=True)
+        self.assertEqual(gml.getFeature('A.1'), {'ex:A': {'@gml:id': 'A.1', '@note': 'a>b'}})
+        self.assertEqual(gml.getFeature('B.1'), {'ex:B': {'@gml:id': 'B.1'}})
+        with self.assertRaises(pygml.GmlException):
+            pygml.Dataset(self.write(b''), lazy=True)
+
+    def test_persistent_index(self):
+        """The member index is reused from its sidecar until the file changes."""
+        filename = self.write(GML_32)
+        self.assertIsNone(index.loadSavedMembers(filename))
+        pygml.Dataset(filename, lazy=True)
+        members = index.loadSavedMembers(filename)
+        self.assertEqual(members.ids, index.scanMembers(filename).ids)
+        self.assertEqual(pygml.Dataset(filename, lazy=True).getFeature('CZ.1')['cp:CadastralZoning']['cp:label'],
+                         'Zone 1')
+
+        self.write(GML_32.replace(b'Zone 1', b'Zone 2'))
+        self.assertNotEqual(index.loadSavedMembers(filename).signature, index.getSignature(filename))
+        self.assertEqual(pygml.Dataset(filename, lazy=True).getFeature('CZ.1')['cp:CadastralZoning']['cp:label'],
+                         'Zone 2')
+
+    def append(self, content, closing_tag, member):
+        position = content.rindex(closing_tag)
+        return content[:position] + member + content[position:]
+
+    def test_refresh_appended(self):
+        """Members appended to the file are indexed incrementally."""
+        road = b'<ex:Road gml:id="R.3"><ex:name>C</ex:name></ex:Road>'
+        for content, appended in (
+                (GML_32, self.append(GML_32, b'</wfs:FeatureCollection>', b'<wfs:member>' + road + b'</wfs:member>')),
+                (GML_31, self.append(GML_31, b'</gml:featureMembers>', road))):
+            filename = self.write(content)
+            gml = pygml.Dataset(filename, resolve_xlink_href=False, lazy=True, persistent_index=False)
+            self.assertFalse(gml.refresh())
+            members = index.loadMembers(filename, persistent=False)
+            self.write(appended)
+            self.assertEqual(len(index.appendMembers(filename, members)), len(members) + 1)
+            self.assertTrue(gml.refresh())
+            self.assertEqual(gml.getFeature('R.3')['ex:Road']['ex:name'], 'C')
+            self.assertEqual(list(gml.iterFeatures()),
+                             pygml.Dataset(filename, resolve_xlink_href=False).getFeatures())
+
+    def test_refresh_rewritten(self):
+        """Rewritten files are reloaded."""
+        filename = self.write(GML_32)
+        gml = pygml.Dataset(filename)
+        self.write(GML_31)
+        self.assertTrue(gml.refresh())
+        self.assertIsNone(gml.getFeature('CP.1'))
+        self.assertIsNotNone(gml.getFeature('R.1'))
+
+    def test_progress(self):
+        """Loading reports the parsed bytes and can be cancelled."""
+        filename = self.write(GML_32)
+        for lazy in (False, True):
+            reported = []
+            pygml.Dataset(filename, lazy=lazy, persistent_index=False,
+                          progress=lambda done, total: reported.append((done, total)))
+            self.assertEqual(reported[-1], (len(GML_32), len(GML_32)))
+            with self.assertRaises(pygml.LoadCancelled):
+                pygml.Dataset(filename, lazy=lazy, persistent_index=False, progress=lambda done, total: False)
+
+    def test_parallel(self):
+        """Parsing chunks in parallel gives the same features and references."""
+        mixed = GML_31.replace(b'<gml:featureMembers>', b'<gml:featureMember><ex:Road gml:id="R.0"/></gml:featureMember><gml:featureMembers>')
+        for content in (GML_32, GML_31, GML_2, mixed):
+            filename = self.write(content)
+            expected = pygml.Dataset(filename, persistent_index=False)
+            gml = pygml.Dataset(filename, persistent_index=False, workers=2)
+            self.assertEqual(gml.getFeatures(), expected.getFeatures())
+            self.assertEqual((gml.resolved, gml.unresolved), (expected.resolved, expected.unresolved))
+            self.assertEqual(gml.search('1'), expected.search('1'))
+        gml = pygml.Dataset(self.write(GML_32), persistent_index=False, workers=2)
+        zoning = gml.getFeature('CP.1')['cp:CadastralParcel']['cp:zoning']
+        self.assertIs(zoning['@xlink:href [resolved]'], gml.getFeature('CZ.1'))
+
+    def test_parallel_fallback(self):
+        """Postprocessors which can't be sent to processes fall back to parsing at once."""
+        rules = pygml.PostprocessorRules(drop=['cp:label'])
+        filename = self.write(GML_32)
+        expected = pygml.Dataset(filename, persistent_index=False, postprocessor=rules).getFeatures()
+
+        def local(path, key, value):
+            return rules(path, key, value)
+        for postprocessor in (rules, local):
+            gml = pygml.Dataset(filename, persistent_index=False, workers=2, postprocessor=postprocessor)
+            self.assertEqual(gml.getFeatures(), expected)
+
+    def test_split_members(self):
+        """Members are split into runs of about the same size."""
+        from pygml import parallel
+        members = index.MemberIndex()
+        for position in range(10):
+            members.add(position * 10, position * 10 + 10, ['M.%d' % position])
+        self.assertEqual(parallel.splitMembers(members, 2), [(0, 4), (5, 9)])
+        self.assertEqual(parallel.splitMembers(members, 20), [(position, position) for position in range(10)])
+        self.assertEqual(parallel.splitMembers(index.MemberIndex(), 2), [])
+        self.assertEqual(parallel.getRootTag(b'<?xml version="1.0"?><!-- x --><a b="c>">'), b'<a b="c>">')
+
+    def test_shared_keys(self):
+        """Equal names share one key and key-only postprocessors run once per key."""
+        first, second = pygml.Dataset(self.write(GML_32)).getFeatures()[:2]
+        first, second = first['cp:CadastralParcel'], second['cp:CadastralParcel']
+        self.assertIs(list(first)[-1], list(second)[-1])
+        self.assertIs(list(first['cp:areaValue'])[0], list(second['cp:areaValue'])[0])
+        calls = []
+
+        def counting(path, key, value):
+            calls.append(key)
+            return pygml.postprocessor(path, key, value)
+        counting.key_only = True
+        features = list(pygml.iterFeatures(self.write(GML_32), postprocessor=counting))
+        self.assertEqual(len(calls), len(set(calls)))
+        self.assertNotIn('cp:geometry', features[0]['cp:CadastralParcel'])
+
+    def test_postprocessor_rules(self):
+        """Keys are rewritten by a table of rules, extra properties can be dropped."""
+        rules = pygml.PostprocessorRules()
+        self.assertEqual(rules.getKey('wfs:member'), 'member')
+        self.assertEqual(rules.getKey('gml:featureMembers'), 'featureMembers')
+        self.assertEqual(rules.getKey('gml:id'), 'gml:id')
+        self.assertIsNone(rules.getKey('ex:the_geom'))
+        self.assertIsNone(rules(None, 'cp:geometry', {}))
+        self.assertEqual(rules(None, '@wfs:numberMatched', '3'), ('@numberMatched', '3'))
+        rules = pygml.PostprocessorRules(rename={'cp:label': 'label'}, drop=['cp:areaValue'])
+        for options in ({}, {'lazy': True}, {'streaming': True}):
+            gml = pygml.Dataset(self.write(GML_32), postprocessor=rules, **options)
+            properties = gml.getFeature('CP.1')['cp:CadastralParcel']
+            self.assertEqual(list(properties), ['@gml:id', 'label', 'cp:zoning'])
+
+    def test_skip_geometry(self):
+        """Dropped elements are skipped with their content, also when parsed in blocks."""
+        data = (b'<wfs:FeatureCollection xmlns:wfs="w" xmlns:gml="g" xmlns:ex="e"><wfs:member>'
+                b'<ex:Road gml:id="R.1"><ex:geometry><gml:LineString xmlns:x="x" gml:id="G.1">'
+                b'<gml:posList>0 0 1 1</gml:posList><ex:geometry xlink:href="#R.2"/>'
+                b'</gml:LineString></ex:geometry><ex:name>A</ex:name></ex:Road></wfs:member>'
+                b'<wfs:member><ex:position>1 1</ex:position></wfs:member>'
+                b'<wfs:member><ex:Road gml:id="R.2"><ex:name>B</ex:name>'
+                b'</ex:Road></wfs:member></wfs:FeatureCollection>')
+        filename = self.write(data)
+        for blocksize in (7, 2 ** 16):
+            hrefs = []
+            features = list(pygml.iterFeatures(filename, blocksize=blocksize, hrefs=hrefs))
+            self.assertEqual(features, [
+                {'ex:Road': {'@gml:id': 'R.1', 'ex:name': 'A'}},
+                {'ex:Road': {'@gml:id': 'R.2', 'ex:name': 'B'}}])
+            self.assertEqual(hrefs, [])
+        self.assertEqual(pygml.Dataset(filename, lazy=True).getFeature('R.1'), features[0])
+
+    def test_unsupported_container(self):
+        """Unknown containers raise a GmlException."""
+        with self.assertRaises(pygml.GmlException):
+            pygml.Dataset(self.write(b'<foo><bar/></foo>'))
+        with self.assertRaises(pygml.GmlException):
+            pygml.Dataset(self.write(b'<foo><bar/></foo>'), lazy=True)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DatasetTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,70 @@
+# coding=utf-8
+"""pygml query tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pygml import pygml, query
+from test_pygml import GML_32
+
+
+class QueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'parcels.gml')
+        with open(self.filename, 'wb') as f:
+            f.write(GML_32)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def getIds(self, text, **options):
+        gml = pygml.Dataset(self.filename, persistent_index=False, **options)
+        return [pygml.getIds(feature)[0] for feature in gml.queryFeatures(text)]
+
+    def test_path(self):
+        self.assertEqual(self.getIds('/cp:CadastralParcel'), ['CP.1', 'CP.2'])
+        self.assertEqual(self.getIds('/*/cp:label'), ['CP.1', 'CP.2', 'CZ.1'])
+        self.assertEqual(self.getIds('//@xlink:href'), ['CP.1', 'CP.2'])
+        self.assertEqual(self.getIds('/cp:CadastralZoning/cp:areaValue'), [])
+
+    def test_comparison(self):
+        self.assertEqual(self.getIds('/*[cp:areaValue > 1000]'), ['CP.1'])
+        self.assertEqual(self.getIds('/*[cp:areaValue/@uom = "m2" and cp:areaValue <= 1000]'), ['CP.2'])
+        self.assertEqual(self.getIds("/*[cp:label ~ 'ZONE' or @gml:id = 'CP.2']"), ['CP.2', 'CZ.1'])
+        self.assertEqual(self.getIds('/*[not(cp:label != "1/1")]'), ['CP.1'])
+        # text which isn't a number never compares to one
+        self.assertEqual(self.getIds('/*[cp:label > 0]'), [])
+
+    def test_resolved(self):
+        text = '/cp:CadastralParcel[cp:areaValue > 500 and .//*[@xlink:href and not resolved()]]'
+        for options in ({}, {'lazy': True}, {'lazy': True, 'lazy_xlink_href': True}):
+            self.assertEqual(self.getIds(text, **options), ['CP.2'])
+        # resolved references aren't followed
+        self.assertEqual(self.getIds('/cp:CadastralParcel//cp:CadastralZoning'), [])
+
+    def test_select(self):
+        compiled = query.compileQuery('//@gml:id')
+        gml = pygml.Dataset(self.filename, persistent_index=False)
+        self.assertEqual(compiled.select(gml.getFeature('CP.1')), ['CP.1'])
+        self.assertIs(query.compileQuery('//@gml:id'), compiled)
+
+    def test_errors(self):
+        for text in ('', '/a[', '/a[b >]', '/a b', '/[x]', '/a[b = c]', '/a[b ? 1]', '/a[b ~ 5]'):
+            self.assertRaises(query.QueryError, query.compileQuery, text)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(QueryTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
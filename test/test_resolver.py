@@ -0,0 +1,129 @@
+# coding=utf-8
+"""pygml Resolver tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pygml import index, pygml, resolver
+
+
+ADDRESSES = b'''<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:gml="http://www.opengis.net/gml/3.2"
+    xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:ad="urn:x-inspire:specification:gmlas:Addresses:3.0">
+  <wfs:member>
+    <ad:Address gml:id="AD.1">
+      <ad:adminUnit xlink:href="units.gml#AU.1"/>
+      <ad:parcel xlink:href="CP.1"/>
+      <ad:component xlink:href="#AD.404"/>
+    </ad:Address>
+  </wfs:member>
+</wfs:FeatureCollection>
+'''
+
+UNITS = b'''<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:gml="http://www.opengis.net/gml/3.2"
+    xmlns:au="urn:x-inspire:specification:gmlas:AdministrativeUnits:3.0">
+  <wfs:member>
+    <au:AdministrativeUnit gml:id="AU.1"><au:name>Schwerin</au:name></au:AdministrativeUnit>
+  </wfs:member>
+</wfs:FeatureCollection>
+'''
+
+PARCELS = b'''<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:gml="http://www.opengis.net/gml/3.2"
+    xmlns:cp="urn:x-inspire:specification:gmlas:CadastralParcels:3.0">
+  <wfs:member>
+    <cp:CadastralParcel gml:id="CP.1"><cp:label>1/1</cp:label></cp:CadastralParcel>
+  </wfs:member>
+</wfs:FeatureCollection>
+'''
+
+
+class ResolverTest(unittest.TestCase):
+    """Test resolving references across the files of a folder."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.tmpdir = tempfile.mkdtemp()
+        for name, content in (('addresses.gml', ADDRESSES), ('units.gml', UNITS), ('parcels.gml', PARCELS)):
+            with open(os.path.join(self.tmpdir, name), 'wb') as f:
+                f.write(content)
+
+    def tearDown(self):
+        """Runs after each test."""
+        for name in os.listdir(self.tmpdir):
+            sidecar = index.getSidecar(os.path.join(self.tmpdir, name))
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+        shutil.rmtree(self.tmpdir)
+
+    def test_resolve_across_files(self):
+        """file.gml#id and bare ids are resolved in sibling files."""
+        references = resolver.Resolver()
+        references.registerFolder(self.tmpdir)
+        for lazy in (False, True):
+            gml = pygml.Dataset(os.path.join(self.tmpdir, 'addresses.gml'), lazy=lazy, resolver=references)
+            address = gml.getFeature('AD.1')['ad:Address']
+            unit = address['ad:adminUnit']['@xlink:href [resolved]']
+            self.assertEqual(unit['au:AdministrativeUnit']['au:name'], 'Schwerin')
+            parcel = address['ad:parcel']['@xlink:href [resolved]']
+            self.assertEqual(parcel['cp:CadastralParcel']['cp:label'], '1/1')
+            self.assertNotIn('@xlink:href [resolved]', address['ad:component'])
+
+    def test_datasets_are_shared(self):
+        """Every target file is opened once."""
+        references = resolver.Resolver()
+        references.registerFolder(self.tmpdir)
+        filename = os.path.join(self.tmpdir, 'addresses.gml')
+        pygml.Dataset(filename, resolver=references)
+        pygml.Dataset(filename, lazy=True, resolver=references)
+        self.assertEqual(sorted(os.path.basename(path) for path in references.datasets.keys()),
+                         ['parcels.gml', 'units.gml'])
+        self.assertEqual(references.datasets.misses, 2)
+
+    def test_uri_hrefs(self):
+        """URNs and URLs are not looked up in the registered files."""
+        references = resolver.Resolver()
+        references.registerFolder(self.tmpdir)
+        base = os.path.join(self.tmpdir, 'addresses.gml')
+        self.assertIsNone(references.getTarget('urn:x-inspire:object:id:CP.1', base))
+        self.assertIsNone(references.getTarget('http://example.org/CP.1', base))
+        self.assertFalse(references.isIndexed())
+        self.assertIsNotNone(references.getTarget('CP.1', base))
+        self.assertTrue(references.isIndexed())
+
+    def test_background(self):
+        """With background=True, ids are only found after indexIds()."""
+        references = resolver.Resolver(background=True)
+        references.registerFolder(self.tmpdir)
+        base = os.path.join(self.tmpdir, 'addresses.gml')
+        self.assertIsNone(references.getTarget('CP.1', base))
+        reported = []
+        references.indexIds(progress=lambda done, total: reported.append((done, total)))
+        self.assertEqual(reported, [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual(os.path.basename(references.findPath('CP.1')), 'parcels.gml')
+        self.assertIsNotNone(references.getTarget('CP.1', base))
+
+    def test_without_resolver(self):
+        """References to other files stay unresolved without a resolver."""
+        gml = pygml.Dataset(os.path.join(self.tmpdir, 'addresses.gml'))
+        self.assertEqual((gml.resolved, gml.unresolved), (0, 3))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ResolverTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
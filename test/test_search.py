@@ -0,0 +1,73 @@
+# coding=utf-8
+"""pygml word index tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+import unittest
+
+from pygml import pygml, search
+from test_pygml import GML_31, GML_32
+
+
+class SearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'parcels.gml')
+        with open(self.filename, 'wb') as f:
+            f.write(GML_32)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_words(self):
+        feature = OrderedDict([('cp:Parcel', OrderedDict([
+            ('@gml:id', 'CP.1'), ('cp:label', ['Main Street', None]),
+            ('cp:zoning', OrderedDict([('@xlink:href', '#CZ.1'),
+                                       ('@xlink:href [resolved]', {'cp:Zoning': 'Hidden'})]))]))])
+        self.assertEqual(sorted(set(search.iterWords(feature))),
+                         ['1', 'cp', 'cz', 'gml', 'href', 'id', 'label', 'main', 'parcel', 'street', 'xlink', 'zoning'])
+
+    def test_search(self):
+        for options in ({}, {'lazy': True}, {'streaming': True}):
+            gml = pygml.Dataset(self.filename, persistent_index=False, **options)
+            self.assertEqual(gml.search('ZONE'), ['CZ.1'])
+            self.assertEqual(gml.search('m2 1/1'), ['CP.1', 'CP.2'])
+            self.assertEqual(gml.search('label 1 2'), ['CP.2'])
+            # the last word is a prefix
+            self.assertEqual(gml.search('cadastralp'), ['CP.1', 'CP.2'])
+            self.assertEqual(gml.search('cadastralparcel 120'), ['CP.1'])
+            self.assertEqual(gml.search('missing 1'), [])
+            self.assertEqual(gml.search(' '), [])
+
+    def test_refresh(self):
+        gml = pygml.Dataset(self.filename, lazy=True, persistent_index=False)
+        self.assertEqual(gml.search('road'), [])
+        size = gml.estimateSize()
+        self.assertGreater(size, 0)
+        with open(self.filename, 'wb') as f:
+            f.write(GML_31 + b' ' * 100)
+        self.assertTrue(gml.refresh())
+        self.assertEqual(gml.search('road'), ['R.1', 'R.2'])
+
+    def test_progress(self):
+        reported = []
+        gml = pygml.Dataset(self.filename, lazy=True, persistent_index=False)
+        gml.getSearchIndex(progress=lambda done, total: reported.append((done, total)))
+        self.assertEqual(reported[-1], (len(GML_32), len(GML_32)))
+        self.assertIs(gml.getSearchIndex(), gml.getSearchIndex())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SearchTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
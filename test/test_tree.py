@@ -0,0 +1,177 @@
+# coding=utf-8
+"""pygml FeatureTree tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+from collections import OrderedDict
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from pygml import pygml, tree
+
+
+CYCLE = b'''<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:gml="http://www.opengis.net/gml/3.2"
+    xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:ex="http://example.org">
+  <wfs:member>
+    <ex:Building gml:id="B.1">
+      <ex:name>Town hall</ex:name>
+      <ex:address xlink:href="#A.1"/>
+    </ex:Building>
+  </wfs:member>
+  <wfs:member>
+    <ex:Address gml:id="A.1">
+      <ex:street>Main Street</ex:street>
+      <ex:building xlink:href="#B.1"/>
+    </ex:Address>
+  </wfs:member>
+</wfs:FeatureCollection>
+'''
+
+
+class FeatureTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'cycle.gml')
+        with open(self.filename, 'wb') as f:
+            f.write(CYCLE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def getTree(self, max_depth=None, **options):
+        gml = pygml.Dataset(self.filename, persistent_index=False, **options)
+        features = OrderedDict([('Selected feature [1]', gml.getFeature('B.1'))])
+        return tree.FeatureTree(features, ['B.1'], max_depth)
+
+    def getTexts(self, node):
+        return [child.text for child in node.fetchAll()]
+
+    def find(self, node, text):
+        return next(child for child in node.fetchAll() if child.text == text)
+
+    def test_texts(self):
+        feature_tree = self.getTree()
+        selected = self.find(feature_tree.root, 'Selected feature [1]')
+        building = self.find(selected, 'ex:Building')
+        self.assertEqual(self.getTexts(building), ["@gml:id 'B.1'", 'ex:address', "ex:name 'Town hall'"])
+        self.assertEqual(building.children[0].kind, tree.LEAF)
+
+    def test_lazy(self):
+        feature_tree = self.getTree()
+        self.assertEqual(feature_tree.root.children, [])
+        self.assertTrue(feature_tree.root.canFetchMore())
+        self.assertEqual(len(feature_tree.root.fetchMore(10)), 1)
+        self.assertFalse(feature_tree.root.canFetchMore())
+        # nothing below the first level was created
+        self.assertEqual(feature_tree.root.children[0].children, [])
+
+    def test_list(self):
+        feature_tree = tree.FeatureTree(OrderedDict([('values', ['a', OrderedDict([('b', 'c')]), None])]))
+        values = self.find(feature_tree.root, 'values')
+        self.assertEqual(self.getTexts(values), ['a', '[1]', 'None'])
+        self.assertEqual(values.fetchMore(1), [])
+
+    def test_back_reference(self):
+        for options in ({}, {'lazy': True, 'lazy_xlink_href': True}):
+            feature_tree = self.getTree(**options)
+            building = self.find(self.find(feature_tree.root, 'Selected feature [1]'), 'ex:Building')
+            reference = self.find(self.find(building, 'ex:address'), '@xlink:href [resolved]')
+            self.assertEqual(reference.kind, tree.REFERENCE)
+            self.assertTrue(reference.hasChildren())
+            address = self.find(reference, 'ex:Address')
+            back = self.find(self.find(address, 'ex:building'), '@xlink:href [resolved]')
+            self.assertEqual(self.getTexts(back), [u'↻ already shown: B.1'])
+            self.assertEqual(back.children[0].kind, tree.BACK_REFERENCE)
+
+    def test_max_depth(self):
+        feature_tree = self.getTree(max_depth=0)
+        building = self.find(self.find(feature_tree.root, 'Selected feature [1]'), 'ex:Building')
+        reference = self.find(self.find(building, 'ex:address'), '@xlink:href [resolved]')
+        self.assertEqual(self.getTexts(reference), [u'\u2026 more than 0 references deep'])
+        self.assertEqual(reference.children[0].kind, tree.MESSAGE)
+        # the feature wasn't shown, so it is expanded when referenced less deep
+        self.assertEqual(feature_tree.shown, {'B.1'})
+        feature_tree = self.getTree(max_depth=1)
+        building = self.find(self.find(feature_tree.root, 'Selected feature [1]'), 'ex:Building')
+        reference = self.find(self.find(building, 'ex:address'), '@xlink:href [resolved]')
+        self.assertEqual(self.getTexts(reference), ['ex:Address'])
+
+    def getVisible(self, node, mask):
+        return [child.text for child in node.children if mask[child.position]]
+
+    def test_match(self):
+        feature_tree = self.getTree()
+        mask = feature_tree.match('TOWN')
+        selected = feature_tree.root.children[0]
+        building = selected.children[0]
+        self.assertEqual(self.getVisible(feature_tree.root, mask), ['Selected feature [1]'])
+        self.assertEqual(self.getVisible(building, mask), ["ex:name 'Town hall'"])
+        # all properties of a matching element are visible
+        mask = feature_tree.match('building')
+        self.assertEqual(len(self.getVisible(building, mask)), 3)
+        # queries may span labels
+        mask = feature_tree.match("b.1' > ex:build")
+        self.assertEqual(self.getVisible(building, mask), ["@gml:id 'B.1'"])
+        # references are not followed by the search
+        reference = building.children[1].children[1]
+        self.assertEqual(reference.text, '@xlink:href [resolved]')
+        self.assertEqual(reference.children, [])
+        self.assertEqual(self.getVisible(building, feature_tree.match('main street')), [])
+
+    def test_match_expanded(self):
+        feature_tree = self.getTree()
+        index = feature_tree.getIndex()
+        self.assertIs(feature_tree.getIndex(), index)
+        reference = feature_tree.root.children[0].children[0].children[1].children[1]
+        reference.fetchAll()
+        # the index is rebuilt to include the expanded reference
+        self.assertFalse(feature_tree.isIndexed())
+        mask = feature_tree.match('main street')
+        self.assertEqual(self.getVisible(reference, mask), ['ex:Address'])
+
+    def test_long_list(self):
+        # regression benchmark: equal elements used to be labelled by
+        # list.index(), which is quadratic and labels all of them [0]
+        count = 50000
+        with open(self.filename, 'wb') as f:
+            f.write(CYCLE.split(b'<wfs:member>')[0])
+            f.write(b'<wfs:member><ex:Route gml:id="R.1">')
+            f.write(b'<ex:stop><ex:name>Stop</ex:name></ex:stop>' * count)
+            f.write(b'</ex:Route></wfs:member></wfs:FeatureCollection>')
+        gml = pygml.Dataset(self.filename, persistent_index=False)
+        feature_tree = tree.FeatureTree(OrderedDict([('Selected feature [1]', gml.getFeature('R.1'))]))
+        route = self.find(self.find(feature_tree.root, 'Selected feature [1]'), 'ex:Route')
+        stops = self.find(route, 'ex:stop')
+        start = time.time()
+        self.assertTrue(stops.hasChildren())
+        texts = self.getTexts(stops)
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(len(texts), count)
+        # positions 3 and 4 are no back-reference or message nodes
+        self.assertEqual(texts[:5], ['[0]', '[1]', '[2]', '[3]', '[4]'])
+        self.assertEqual(set(node.kind for node in stops.children[:5]), {tree.NODE})
+        self.assertEqual(texts[-1], '[%d]' % (count - 1))
+        self.assertEqual(self.getTexts(stops.children[-1]), ["ex:name 'Stop'"])
+
+    def test_message(self):
+        feature_tree = tree.FeatureTree.fromMessage('Loading')
+        self.assertEqual([(node.text, node.kind) for node in feature_tree.root.fetchAll()],
+                         [('Loading', tree.MESSAGE)])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FeatureTreeTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)